@@ -0,0 +1,217 @@
+"""Benchmark suite for the story_wrapper data loaders and story model.
+
+    Runs offline against a synthetic corpus from `benchmarks.synthetic_corpus`,
+    saves the timings as JSON and compares them with a stored baseline.
+
+    Usage:
+        python -m benchmarks.run_benchmarks
+        python -m benchmarks.run_benchmarks --update-baseline
+        python -m benchmarks.run_benchmarks --only book_segmentation story_process
+
+"""
+from typing import Callable, Dict, List, Optional
+from contextlib import contextmanager
+import argparse
+import json
+import logging
+import os
+import platform
+import statistics
+import sys
+import tempfile
+import time
+from story_wrapper.data_loaders import parseRDF
+from story_wrapper.data_loaders.book import Book
+from benchmarks.synthetic_corpus import generate_book_mirror, generate_book_text, generate_rdf_tarball
+
+# Get path of current folder
+CURRENT_FOLDER = os.path.dirname(os.path.abspath(__file__))
+BASELINE_PATH = os.path.join(CURRENT_FOLDER, 'baseline.json')
+RESULTS_PATH = os.path.join(CURRENT_FOLDER, 'results.json')
+# A benchmark regresses when its best time exceeds the baseline best time by this factor
+TOLERANCE = 1.3
+
+
+def timed(func: Callable, repeat: int, items: int, setup: Optional[Callable] = None) -> Dict:
+    """Time func over several runs, calling setup (untimed) before each run."""
+    timings = []
+    for _ in range(repeat):
+        if setup is not None:
+            setup()
+        start = time.perf_counter()
+        func()
+        timings.append(time.perf_counter() - start)
+    median = statistics.median(timings)
+    return {
+        'repeat': repeat,
+        'items': items,
+        'min_seconds': min(timings),
+        'median_seconds': median,
+        'mean_seconds': statistics.mean(timings),
+        'items_per_second': items / median if median else None,
+    }
+
+
+@contextmanager
+def metadata_paths(folder: str):
+    """Point parseRDF at a catalogue and metadata pickle inside folder."""
+    original = parseRDF.PICKLEFILE, parseRDF.RDFFILES
+    parseRDF.PICKLEFILE = os.path.join(folder, 'md.pickle.gz')
+    parseRDF.RDFFILES = os.path.join(folder, 'rdf-files.tar.bz2')
+    try:
+        yield
+    finally:
+        parseRDF.PICKLEFILE, parseRDF.RDFFILES = original
+
+
+def remove_file(path: str):
+    """Remove a file if it exists."""
+    if os.path.exists(path):
+        os.remove(path)
+
+
+def bench_book_segmentation(args) -> Dict:
+    """Segment synthetic book texts into chapters and paragraphs."""
+    texts = [generate_book_text(book_id, seed=args.seed) for book_id in range(1, args.books + 1)]
+
+    def run():
+        for book_id, text in enumerate(texts, 1):
+            Book(book_id, text)
+    return timed(run, args.repeat, len(texts))
+
+
+def bench_parsemetadata(args, folder: str) -> Dict:
+    """Build the metadata dict from the RDF tarball (cold, no pickle)."""
+    with metadata_paths(folder):
+        return timed(
+            parseRDF.readmetadata, args.repeat, args.rdf_records,
+            setup=lambda: remove_file(parseRDF.PICKLEFILE)
+        )
+
+
+def bench_readmetadata(args, folder: str) -> Dict:
+    """Read the metadata dict from the cached pickle."""
+    with metadata_paths(folder):
+        parseRDF.readmetadata()
+        return timed(parseRDF.readmetadata, args.repeat, args.rdf_records)
+
+
+def bench_gutenberg_index(args, folder: str) -> Dict:
+    """Build the fiction index from cached metadata and a mirrored corpus."""
+    from story_wrapper.data_loaders.gutenberg import Gutenberg
+    data_path = os.path.join(folder, 'mirror')
+    generate_book_mirror(data_path, list(range(1, args.rdf_records + 1)), seed=args.seed,
+                         num_chapters=1, paragraphs_per_chapter=1)
+    index_folder = os.path.join(folder, 'index')
+    os.makedirs(os.path.join(index_folder, 'indexes'), exist_ok=True)
+    with metadata_paths(folder):
+        parseRDF.readmetadata()
+        return timed(
+            lambda: Gutenberg(data_path=data_path, index_path=index_folder).fiction_md, args.repeat, args.rdf_records,
+            setup=lambda: remove_file(os.path.join(index_folder, 'indexes', 'fiction_index.gz'))
+        )
+
+
+def bench_story_process(args) -> Dict:
+    """Process synthetic paragraphs through Story with a blank spaCy pipeline."""
+    import spacy
+    from story_wrapper.config_spacy import nlp_service
+    from story_wrapper.models.story import Story
+    nlp = spacy.blank('en')
+    nlp.add_pipe('sentencizer')
+    nlp_service.nlp = nlp
+    paragraphs = Book(1, generate_book_text(1, seed=args.seed)).paragraphs
+    story = Story(paragraphs, process_on_load=False)
+    return timed(story.process, args.repeat, len(paragraphs))
+
+
+def run_benchmarks(args) -> Dict:
+    """Run the selected benchmarks and return the results document."""
+    results = {}
+    with tempfile.TemporaryDirectory() as folder:
+        generate_rdf_tarball(os.path.join(folder, 'rdf-files.tar.bz2'), args.rdf_records, seed=args.seed)
+        benchmarks = {
+            'book_segmentation': lambda: bench_book_segmentation(args),
+            'parsemetadata': lambda: bench_parsemetadata(args, folder),
+            'readmetadata': lambda: bench_readmetadata(args, folder),
+            'gutenberg_index': lambda: bench_gutenberg_index(args, folder),
+            'story_process': lambda: bench_story_process(args),
+        }
+        for name, bench in benchmarks.items():
+            if args.only and name not in args.only:
+                continue
+            logging.info(f"Running benchmark {name}.")
+            results[name] = bench()
+    return {
+        'meta': {
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'books': args.books,
+            'rdf_records': args.rdf_records,
+            'seed': args.seed,
+        },
+        'benchmarks': results,
+    }
+
+
+def compare(results: Dict, baseline: Dict, tolerance: float = TOLERANCE) -> List[Dict]:
+    """Compare best-of-repeat timings, which are the least noisy, against a baseline results document."""
+    rows = []
+    for name, result in results['benchmarks'].items():
+        base = baseline.get('benchmarks', {}).get(name)
+        if base is None:
+            rows.append({'name': name, 'min_seconds': result['min_seconds'], 'ratio': None, 'regression': False})
+            continue
+        ratio = result['min_seconds'] / base['min_seconds']
+        rows.append({
+            'name': name,
+            'min_seconds': result['min_seconds'],
+            'baseline_seconds': base['min_seconds'],
+            'ratio': ratio,
+            'regression': ratio > tolerance,
+        })
+    return rows
+
+
+def parse_args(argv: Optional[List[str]] = None):
+    """Parse command line arguments."""
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--output', default=RESULTS_PATH, help="Where to write the results JSON.")
+    parser.add_argument('--baseline', default=BASELINE_PATH, help="Baseline results JSON to compare against.")
+    parser.add_argument('--update-baseline', action='store_true', help="Overwrite the baseline with these results.")
+    parser.add_argument('--tolerance', type=float, default=TOLERANCE, help="Allowed slowdown ratio.")
+    parser.add_argument('--repeat', type=int, default=7, help="Timed runs per benchmark.")
+    parser.add_argument('--books', type=int, default=20, help="Number of synthetic books to segment.")
+    parser.add_argument('--rdf-records', type=int, default=500, help="Number of synthetic RDF records.")
+    parser.add_argument('--seed', type=int, default=0, help="Seed for the synthetic corpus.")
+    parser.add_argument('--only', nargs='*', help="Names of benchmarks to run.")
+    return parser.parse_args(argv)
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    """Run the benchmarks, save the results and report regressions."""
+    logging.basicConfig(level=logging.WARNING)
+    args = parse_args(argv)
+    results = run_benchmarks(args)
+    with open(args.output, 'w') as output_file:
+        json.dump(results, output_file, indent=2)
+    if args.update_baseline:
+        with open(args.baseline, 'w') as baseline_file:
+            json.dump(results, baseline_file, indent=2)
+        print(f"Baseline updated at {args.baseline}")
+        return 0
+    if not os.path.exists(args.baseline):
+        print(f"No baseline at {args.baseline} - run with --update-baseline to create one.")
+        return 0
+    with open(args.baseline) as baseline_file:
+        baseline = json.load(baseline_file)
+    rows = compare(results, baseline, args.tolerance)
+    for row in rows:
+        ratio = "new" if row['ratio'] is None else f"{row['ratio']:.2f}x"
+        flag = "  REGRESSION" if row['regression'] else ""
+        print(f"{row['name']:<20} {row['min_seconds'] * 1000:10.2f} ms  {ratio:>6}{flag}")
+    return 1 if any(row['regression'] for row in rows) else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
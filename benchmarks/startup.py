@@ -0,0 +1,82 @@
+"""Startup-time benchmark for cold imports of each story_wrapper subpackage.
+
+    Each module is imported in a fresh interpreter. The benchmark fails if the best
+    import time exceeds the module's budget, or if a module that should be lightweight
+    pulls in a heavy dependency such as spaCy.
+
+    Usage:
+        python -m benchmarks.startup
+
+"""
+from typing import Dict, List, Optional
+import argparse
+import json
+import subprocess
+import sys
+
+# Budget in seconds for the cold import of each module
+BUDGETS = {
+    'story_wrapper': 0.05,
+    'story_wrapper.instrumentation': 0.1,
+    'story_wrapper.config_spacy': 0.1,
+    'story_wrapper.data_loaders.book': 0.1,
+    'story_wrapper.data_loaders.parseRDF': 0.15,
+    'story_wrapper.data_loaders.gutenberg': 0.15,
+    'story_wrapper.data_loaders.cli': 0.15,
+    'story_wrapper.models.story': 0.15,
+}
+# Dependencies that must only be imported on first use
+HEAVY_MODULES = ['spacy', 'thinc', 'torch', 'requests']
+
+IMPORT_SCRIPT = """
+import json, sys, time
+start = time.perf_counter()
+import {module}
+seconds = time.perf_counter() - start
+print(json.dumps([seconds, sorted(set({heavy}) & set(sys.modules))]))
+"""
+
+
+def measure_import(module: str, repeat: int = 5) -> Dict:
+    """Import module in fresh interpreters and return the best time and any heavy modules loaded."""
+    timings = []
+    heavy = []
+    for _ in range(repeat):
+        output = subprocess.run(
+            [sys.executable, '-c', IMPORT_SCRIPT.format(module=module, heavy=HEAVY_MODULES)],
+            check=True, capture_output=True, text=True
+        ).stdout
+        seconds, heavy = json.loads(output.strip().splitlines()[-1])
+        timings.append(seconds)
+    return {'seconds': min(timings), 'heavy_modules': heavy}
+
+
+def check_startup(budgets: Dict[str, float] = BUDGETS, repeat: int = 5) -> List[Dict]:
+    """Measure each module and compare it with its budget."""
+    rows = []
+    for module, budget in budgets.items():
+        result = measure_import(module, repeat)
+        result.update({
+            'module': module,
+            'budget': budget,
+            'ok': result['seconds'] <= budget and not result['heavy_modules'],
+        })
+        rows.append(result)
+    return rows
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    """Run the startup benchmark and report modules over budget."""
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--repeat', type=int, default=5, help="Fresh interpreters per module.")
+    args = parser.parse_args(argv)
+    rows = check_startup(repeat=args.repeat)
+    for row in rows:
+        flag = "" if row['ok'] else "  OVER BUDGET"
+        heavy = f"  imports {', '.join(row['heavy_modules'])}" if row['heavy_modules'] else ""
+        print(f"{row['module']:<40} {row['seconds'] * 1000:8.1f} ms / {row['budget'] * 1000:6.0f} ms{heavy}{flag}")
+    return 0 if all(row['ok'] for row in rows) else 1
+
+
+if __name__ == '__main__':
+    sys.exit(main())
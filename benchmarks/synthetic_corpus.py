@@ -0,0 +1,208 @@
+"""Deterministic generator for a synthetic Gutenberg-like corpus.
+
+    Produces book texts with a Gutenberg header, a table of contents, chapter
+    headings and an end marker, plus RDF catalogue tarballs in the layout of
+    `rdf-files.tar.bz2`, so the data loaders can be exercised without the real corpus.
+
+"""
+from typing import Dict, List
+import io
+import os
+import random
+import tarfile
+import zipfile
+
+# Vocabulary for the body text - avoids single letter words and "chapter" so body
+# lines cannot be mistaken for headings by Book.get_headings
+VOCABULARY = [
+    'the', 'and', 'was', 'that', 'his', 'her', 'with', 'had', 'for', 'she', 'him', 'not', 'but', 'you',
+    'said', 'were', 'they', 'have', 'one', 'from', 'all', 'been', 'would', 'there', 'when', 'which',
+    'little', 'could', 'into', 'more', 'before', 'house', 'door', 'night', 'morning', 'letter', 'river',
+    'captain', 'garden', 'window', 'silence', 'road', 'stranger', 'lantern', 'village', 'winter', 'horse',
+    'looked', 'walked', 'answered', 'turned', 'remembered', 'waited', 'smiled', 'whispered', 'laughed',
+    'quietly', 'slowly', 'suddenly', 'again', 'never', 'always', 'perhaps', 'towards', 'across', 'under',
+]
+NOUNS = ['house', 'door', 'night', 'morning', 'letter', 'river', 'captain', 'garden', 'window', 'road', 'stranger',
+         'lantern', 'village', 'winter', 'horse']
+NAMES = ['Margaret', 'Thomas', 'Eleanor', 'Hugh', 'Beatrice', 'Oliver', 'Agnes', 'Walter', 'Clara', 'Edmund']
+SURNAMES = ['Ashdown', 'Bellamy', 'Carew', 'Dunmore', 'Everard', 'Fairfax', 'Greville', 'Hartley']
+SUBJECTS = [
+    'Adventure stories', 'Detective and mystery stories', 'Love stories', 'Sea stories',
+    'England -- Social life and customs -- 19th century -- Fiction', 'Science fiction',
+    'Historical fiction', 'Ghost stories', 'Essays', 'Natural history', 'Cookery',
+]
+LCC = ['PR', 'PS', 'PZ', 'QH', 'TX']
+
+RDF_TEMPLATE = """<?xml version="1.0" encoding="utf-8"?>
+<rdf:RDF xml:base="http://www.gutenberg.org/"
+  xmlns:rdf="http://www.w3.org/1999/02/22-rdf-syntax-ns#"
+  xmlns:pgterms="http://www.gutenberg.org/2009/pgterms/"
+  xmlns:dcterms="http://purl.org/dc/terms/"
+  xmlns:dcam="http://purl.org/dc/dcam/">
+  <pgterms:ebook rdf:about="ebooks/{id}">
+    <dcterms:creator>
+      <pgterms:agent rdf:about="2009/agents/{agent_id}">
+        <pgterms:name>{author}</pgterms:name>
+        <pgterms:birthdate rdf:datatype="http://www.w3.org/2001/XMLSchema#integer">{birth}</pgterms:birthdate>
+        <pgterms:deathdate rdf:datatype="http://www.w3.org/2001/XMLSchema#integer">{death}</pgterms:deathdate>
+      </pgterms:agent>
+    </dcterms:creator>
+    <dcterms:title>{title}</dcterms:title>
+{subjects}
+    <dcterms:hasFormat>
+      <pgterms:file rdf:about="http://www.gutenberg.org/files/{id}/{id}.zip">
+        <dcterms:format>
+          <rdf:Description>
+            <dcam:memberOf rdf:resource="http://purl.org/dc/terms/IMT"/>
+            <rdf:value rdf:datatype="http://purl.org/dc/terms/IMT">text/plain; charset=us-ascii</rdf:value>
+          </rdf:Description>
+        </dcterms:format>
+      </pgterms:file>
+    </dcterms:hasFormat>
+    <dcterms:type>
+      <rdf:Description>
+        <dcam:memberOf rdf:resource="http://purl.org/dc/terms/DCMIType"/>
+        <rdf:value>Text</rdf:value>
+      </rdf:Description>
+    </dcterms:type>
+    <dcterms:language>
+      <rdf:Description>
+        <rdf:value rdf:datatype="http://purl.org/dc/terms/RFC4646">{language}</rdf:value>
+      </rdf:Description>
+    </dcterms:language>
+    <pgterms:downloads rdf:datatype="http://www.w3.org/2001/XMLSchema#integer">{downloads}</pgterms:downloads>
+  </pgterms:ebook>
+</rdf:RDF>
+"""
+SUBJECT_TEMPLATE = """    <dcterms:subject>
+      <rdf:Description>
+        <dcam:memberOf rdf:resource="http://purl.org/dc/terms/{scheme}"/>
+        <rdf:value>{value}</rdf:value>
+      </rdf:Description>
+    </dcterms:subject>"""
+
+
+def to_roman(number: int) -> str:
+    """Convert a positive integer to upper case roman numerals."""
+    numerals = [(1000, 'M'), (900, 'CM'), (500, 'D'), (400, 'CD'), (100, 'C'), (90, 'XC'),
+                (50, 'L'), (40, 'XL'), (10, 'X'), (9, 'IX'), (5, 'V'), (4, 'IV'), (1, 'I')]
+    result = ''
+    for value, numeral in numerals:
+        while number >= value:
+            result += numeral
+            number -= value
+    return result
+
+
+def generate_paragraph(rng: random.Random, num_sentences: int = 5, width: int = 70) -> List[str]:
+    """Generate a paragraph of nonsense sentences wrapped into lines."""
+    words = []
+    for _ in range(num_sentences):
+        sentence = [rng.choice(VOCABULARY) for _ in range(rng.randint(6, 16))]
+        if rng.random() < 0.3:
+            sentence[rng.randrange(len(sentence))] = rng.choice(NAMES)
+        sentence[0] = sentence[0].capitalize()
+        sentence[-1] += '.'
+        words.extend(sentence)
+    lines, line = [], []
+    for word in words:
+        if line and len(' '.join(line + [word])) > width:
+            lines.append(' '.join(line))
+            line = []
+        line.append(word)
+    lines.append(' '.join(line))
+    return lines
+
+
+def generate_book_text(book_id: int, num_chapters: int = 12, paragraphs_per_chapter: int = 25,
+                       seed: int = 0) -> str:
+    """Generate the text of a synthetic Gutenberg book.
+
+    The text has a header, a table of contents, `num_chapters` chapters headed
+    "CHAPTER <roman numeral>" and a Project Gutenberg end marker followed by licence text.
+    """
+    rng = random.Random(f"{seed}-{book_id}")
+    title = f"The {rng.choice(NOUNS).capitalize()} of {rng.choice(NAMES)} {rng.choice(SURNAMES)}"
+    author = f"{rng.choice(NAMES)} {rng.choice(SURNAMES)}"
+    lines = [
+        f"The Project Gutenberg EBook of {title}, by {author}",
+        "",
+        "This eBook is for the use of anyone anywhere at no cost and with",
+        "almost no restrictions whatsoever.",
+        "",
+        f"Title: {title}",
+        "",
+        f"Author: {author}",
+        "",
+        f"Release Date: July 22, 2010 [EBook #{book_id}]",
+        "",
+        f"*** START OF THIS PROJECT GUTENBERG EBOOK {title.upper()} ***",
+        "", "", "",
+        "CONTENTS",
+        "",
+    ]
+    lines.extend(f"CHAPTER {to_roman(i + 1)}" for i in range(num_chapters))
+    lines.extend(["", "", ""])
+    for chapter in range(num_chapters):
+        lines.extend([f"CHAPTER {to_roman(chapter + 1)}", "", ""])
+        for _ in range(paragraphs_per_chapter):
+            lines.extend(generate_paragraph(rng, num_sentences=rng.randint(2, 7)))
+            lines.append("")
+        lines.extend(["", ""])
+    lines.extend([
+        f"End of Project Gutenberg's {title}, by {author}",
+        "",
+        "*** END OF THIS PROJECT GUTENBERG EBOOK ***",
+        "",
+        "Updated editions will replace the previous one--the old editions",
+        "will be renamed.",
+    ])
+    return "\n".join(lines)
+
+
+def generate_metadata(book_id: int, seed: int = 0) -> Dict:
+    """Generate the fields used to render a synthetic RDF record."""
+    rng = random.Random(f"{seed}-md-{book_id}")
+    birth = rng.randint(1750, 1900)
+    return {
+        'id': book_id,
+        'agent_id': rng.randint(1, 10000),
+        'author': f"{rng.choice(SURNAMES)}, {rng.choice(NAMES)}",
+        'birth': birth,
+        'death': birth + rng.randint(30, 90),
+        'title': f"The {rng.choice(NOUNS).capitalize()} of {rng.choice(NAMES)}",
+        'subjects': rng.sample(SUBJECTS, rng.randint(1, 3)),
+        'LCC': rng.sample(LCC, 1),
+        'language': 'en' if rng.random() < 0.9 else 'fr',
+        'downloads': int(rng.paretovariate(1.2) * 10),
+    }
+
+
+def render_rdf(metadata: Dict) -> str:
+    """Render a metadata record as a Gutenberg RDF document."""
+    subjects = [SUBJECT_TEMPLATE.format(scheme='LCSH', value=value) for value in metadata['subjects']]
+    subjects += [SUBJECT_TEMPLATE.format(scheme='LCC', value=value) for value in metadata['LCC']]
+    return RDF_TEMPLATE.format(subjects="\n".join(subjects), **{
+        key: value for key, value in metadata.items() if key not in ('subjects', 'LCC')
+    })
+
+
+def generate_rdf_tarball(path: str, num_books: int = 1000, seed: int = 0) -> str:
+    """Write a synthetic `rdf-files.tar.bz2` catalogue to path."""
+    with tarfile.open(path, 'w:bz2') as archive:
+        for book_id in range(1, num_books + 1):
+            data = render_rdf(generate_metadata(book_id, seed)).encode('utf-8')
+            tarinfo = tarfile.TarInfo(f"cache/epub/{book_id}/pg{book_id}.rdf")
+            tarinfo.size = len(data)
+            archive.addfile(tarinfo, io.BytesIO(data))
+    return path
+
+
+def generate_book_mirror(data_path: str, book_ids: List[int], seed: int = 0, **kwargs) -> str:
+    """Write zipped synthetic books in the layout of a mirrored Gutenberg corpus."""
+    for book_id in book_ids:
+        folder = os.path.join(data_path, *str(book_id)[:-1], str(book_id))
+        os.makedirs(folder, exist_ok=True)
+        with zipfile.ZipFile(os.path.join(folder, f"{book_id}.zip"), 'w', zipfile.ZIP_DEFLATED) as book_zip:
+            book_zip.writestr(f"{book_id}.txt", generate_book_text(book_id, seed=seed, **kwargs))
+    return data_path
@@ -0,0 +1,274 @@
+"""Throughput autotuner for the `nlp.pipe` settings used by Story.process.
+
+    Runs a short calibration over a sample of real paragraphs for a grid of
+    `batch_size`, `n_process` and thread settings, measuring paragraphs per second
+    and peak RSS. The best settings are saved per model and host, and picked up
+    by `NLPService.get_pipe_settings`.
+
+    Usage:
+        python -m story_wrapper.autotune
+        python -m story_wrapper.autotune --text-file book.txt --batch-sizes 32 128 --n-process 1 2
+
+"""
+from typing import Dict, Iterable, List, Optional
+import argparse
+import itertools
+import json
+import logging
+import os
+import socket
+import sys
+import threading
+import time
+
+# Where tuned settings are saved - one entry per model and host
+AUTOTUNE_PATH = os.environ.get(
+    'STORY_WRAPPER_AUTOTUNE_PATH', os.path.join(os.path.expanduser('~'), '.cache', 'story_wrapper', 'autotune.json')
+)
+BATCH_SIZES = [16, 64, 256, 1000]
+N_PROCESS = [1, 2, 4]
+# Number of paragraphs used for each trial
+SAMPLE_SIZE = 300
+# Interval between RSS samples during a trial
+RSS_INTERVAL = 0.05
+
+
+def model_key(nlp) -> str:
+    """Return the name of the loaded model, e.g. en_core_web_trf."""
+    return f"{nlp.meta.get('lang', 'xx')}_{nlp.meta.get('name', 'pipeline')}"
+
+
+def host_key() -> str:
+    """Return the name of this host."""
+    return socket.gethostname()
+
+
+def settings_key(model: str, host: Optional[str] = None) -> str:
+    """Return the key under which settings for a model on a host are saved."""
+    return f"{model}@{host or host_key()}"
+
+
+def load_all_settings(path: Optional[str] = None) -> Dict[str, Dict]:
+    """Load all saved settings, keyed by model and host."""
+    path = path or AUTOTUNE_PATH
+    if not os.path.exists(path):
+        return {}
+    try:
+        with open(path) as settings_file:
+            return json.load(settings_file)
+    except json.JSONDecodeError as e:
+        logging.warning(f"Ignoring unreadable pipe settings in {path}: {e!r}")
+        return {}
+
+
+def load_settings(model: str, path: Optional[str] = None) -> Optional[Dict]:
+    """Load the saved settings for a model on this host, or None if it has not been tuned."""
+    return load_all_settings(path).get(settings_key(model))
+
+
+def save_settings(model: str, settings: Dict, path: Optional[str] = None):
+    """Save the settings for a model on this host, keeping settings for other models and hosts."""
+    path = path or AUTOTUNE_PATH
+    all_settings = load_all_settings(path)
+    all_settings[settings_key(model)] = settings
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, 'w') as settings_file:
+        json.dump(all_settings, settings_file, indent=2)
+    os.replace(tmp_path, path)
+    logging.info(f"Saved pipe settings for {model} to {path}.")
+
+
+def set_num_threads(n_threads: Optional[int]) -> bool:
+    """Set the number of threads used by torch, if it is installed. Returns True if applied."""
+    if n_threads is None:
+        return False
+    try:
+        import torch
+    except ImportError:
+        logging.debug("torch is not installed - ignoring thread setting.")
+        return False
+    torch.set_num_threads(n_threads)
+    return True
+
+
+def get_num_threads() -> Optional[int]:
+    """Get the number of threads used by torch, or None if it is not installed."""
+    try:
+        import torch
+    except ImportError:
+        return None
+    return torch.get_num_threads()
+
+
+def process_rss_bytes(pid: int) -> int:
+    """Return the current RSS of a process in bytes, read from /proc (Linux only)."""
+    with open(f"/proc/{pid}/statm") as statm:
+        return int(statm.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+
+
+def child_pids(pid: int) -> List[int]:
+    """Return the ids of the direct child processes of a process (Linux only)."""
+    pids = []
+    for task in os.listdir(f"/proc/{pid}/task"):
+        try:
+            with open(f"/proc/{pid}/task/{task}/children") as children:
+                pids.extend(int(child) for child in children.read().split())
+        except OSError:
+            continue
+    return pids
+
+
+def current_rss_bytes() -> Optional[int]:
+    """Return the combined current RSS of this process and its children, or None if unavailable."""
+    pid = os.getpid()
+    try:
+        total = process_rss_bytes(pid)
+    except OSError:
+        return None
+    for child in child_pids(pid):
+        try:
+            total += process_rss_bytes(child)
+        except OSError:
+            continue
+    return total
+
+
+class RSSSampler:
+    """Samples RSS in a background thread and records the peak."""
+
+    def __init__(self, interval: float = RSS_INTERVAL):
+        self.interval = interval
+        self.peak = None
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+
+    def __enter__(self) -> "RSSSampler":
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self._stop.set()
+        self._thread.join()
+        self._sample()
+
+    def _sample(self):
+        rss = current_rss_bytes()
+        if rss is not None:
+            self.peak = max(self.peak or 0, rss)
+
+    def _run(self):
+        while not self._stop.is_set():
+            self._sample()
+            self._stop.wait(self.interval)
+
+
+def run_trial(nlp, paragraphs: List[str], batch_size: int, n_process: int,
+              n_threads: Optional[int] = None, default_threads: Optional[int] = None) -> Dict:
+    """Process the paragraphs with one combination of settings and measure it.
+
+    A trial with n_threads None runs with default_threads, the count before tuning.
+    """
+    set_num_threads(default_threads if n_threads is None else n_threads)
+    with RSSSampler() as sampler:
+        start = time.perf_counter()
+        for _ in nlp.pipe(paragraphs, batch_size=batch_size, n_process=n_process):
+            pass
+        seconds = time.perf_counter() - start
+    return {
+        'batch_size': batch_size,
+        'n_process': n_process,
+        'n_threads': n_threads,
+        'seconds': seconds,
+        'paragraphs_per_second': len(paragraphs) / seconds if seconds else None,
+        'peak_rss_bytes': sampler.peak,
+    }
+
+
+def autotune(nlp, paragraphs: List[str], batch_sizes: Iterable[int] = BATCH_SIZES,
+             n_process: Iterable[int] = N_PROCESS, n_threads: Iterable[Optional[int]] = (None,),
+             max_rss_bytes: Optional[int] = None, path: Optional[str] = None, save: bool = True) -> Dict:
+    """Run trials over the grid of settings and return (and by default save) the fastest.
+
+    Trials whose peak RSS exceeds `max_rss_bytes` are not considered. The torch
+    thread count is restored afterwards.
+    """
+    if not paragraphs:
+        raise ValueError("No paragraphs to calibrate with.")
+    model = model_key(nlp)
+    # Warm up so that lazy initialisation is not counted in the first trial
+    list(nlp.pipe(paragraphs[:10]))
+    trials = []
+    original_threads = get_num_threads()
+    try:
+        for batch_size, processes, threads in itertools.product(batch_sizes, n_process, n_threads):
+            trial = run_trial(nlp, paragraphs, batch_size, processes, threads, original_threads)
+            logging.info(f"Trial {trial}")
+            trials.append(trial)
+    finally:
+        set_num_threads(original_threads)
+    candidates = [
+        trial for trial in trials
+        if max_rss_bytes is None or trial['peak_rss_bytes'] is None or trial['peak_rss_bytes'] <= max_rss_bytes
+    ]
+    if not candidates:
+        raise ValueError("No settings stayed within the memory limit.")
+    best = max(candidates, key=lambda trial: trial['paragraphs_per_second'])
+    settings = dict(best, model=model, host=host_key(), sample_size=len(paragraphs), tuned_at=time.time(),
+                    trials=trials)
+    if save:
+        save_settings(model, settings, path)
+    return settings
+
+
+def sample_paragraphs(books: Iterable, sample_size: int = SAMPLE_SIZE) -> List[str]:
+    """Take up to sample_size paragraphs, spread across the given books."""
+    books = list(books)
+    per_book = max(1, sample_size // max(1, len(books)))
+    paragraphs = []
+    for book in books:
+        paragraphs.extend(book.paragraphs[:per_book])
+    return paragraphs[:sample_size]
+
+
+def parse_args(argv: Optional[List[str]] = None):
+    """Parse command line arguments."""
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--text-file', nargs='*', help="Book text files to sample, instead of the Gutenberg mirror.")
+    parser.add_argument('--books', type=int, default=5, help="Number of random Gutenberg books to sample.")
+    parser.add_argument('--data-path', default="~/data/gutenberg", help="Path of the mirrored corpus.")
+    parser.add_argument('--sample-size', type=int, default=SAMPLE_SIZE, help="Paragraphs per trial.")
+    parser.add_argument('--batch-sizes', type=int, nargs='+', default=BATCH_SIZES)
+    parser.add_argument('--n-process', type=int, nargs='+', default=N_PROCESS)
+    parser.add_argument('--threads', type=int, nargs='+', default=[None], help="torch thread counts to try.")
+    parser.add_argument('--max-rss-mb', type=int, help="Ignore settings whose peak RSS exceeds this.")
+    parser.add_argument('--output', default=AUTOTUNE_PATH, help="Where to save the settings.")
+    return parser.parse_args(argv)
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    """Calibrate the pipe settings for the configured model on this host."""
+    from story_wrapper.config_spacy import load_model
+    from story_wrapper.data_loaders.book import Book
+    logging.basicConfig(level=logging.INFO)
+    args = parse_args(argv)
+    if args.text_file:
+        books = []
+        for book_id, text_file in enumerate(args.text_file):
+            with open(text_file, errors='ignore') as book_file:
+                books.append(Book(book_id, book_file.read()))
+    else:
+        from story_wrapper.data_loaders.gutenberg import Gutenberg
+        gutenberg = Gutenberg(data_path=args.data_path)
+        books = [gutenberg.get_random_book() for _ in range(args.books)]
+    paragraphs = sample_paragraphs(books, args.sample_size)
+    settings = autotune(
+        load_model(), paragraphs, args.batch_sizes, args.n_process, args.threads,
+        max_rss_bytes=args.max_rss_mb * 1024 * 1024 if args.max_rss_mb else None, path=args.output
+    )
+    print(json.dumps({key: value for key, value in settings.items() if key != 'trials'}, indent=2))
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -1,7 +1,12 @@
-"""File to configure the spaCy processing pipeline."""
+"""File to configure the spaCy processing pipeline.
+
+    spaCy is imported when a model is first loaded, not when this module is imported,
+    so that code which never touches the nlp object starts quickly.
+
+"""
 import os
-import spacy
 import logging
+from story_wrapper.instrumentation import instrumentation, instrument_pipeline
 
 # Retrieve flag indicating whether GPU is enabled
 GPU_ENABLED = os.environ.get('GPU_ENABLED', False)
@@ -14,6 +19,7 @@ SPACY_MODEL = os.environ.get('SPACY_MODEL', 'en_core_web_trf')
 
 def load_model():
     """Load the spacy model and configure the pipeline."""
+    import spacy
     try:
         logging.info(f"Loading Spacy Model {SPACY_MODEL}")
         if GPU_ENABLED:
@@ -36,11 +42,16 @@ def configure_pipeline(nlp):
     # All these need to be after the dependency parse
     logging.debug("Configuring NLP Pipeline and Custom Properties")
     # Use nlp.add_pipe to add components to the pipeline
+    # Time each component when instrumentation is switched on - this must come last.
+    # If it is enabled later, the loaded model is wrapped then by instrument_loaded_model
+    if instrumentation.enabled:
+        nlp = instrument_pipeline(nlp)
     return nlp
 
 
 def download_model():
     """Download the spacy model."""
+    import spacy.cli
     logging.info(f"Downloading Spacy Model {SPACY_MODEL}")
     spacy.cli.download(SPACY_MODEL)
 
@@ -49,12 +60,46 @@ def download_model():
 class NLPService:
     """Service class to wrap the nlp object that consumes GPU resource."""
     nlp = None
+    # Autotuned settings and the model they were loaded for
+    tuned_settings = None
+    tuned_model = None
 
     def get_nlp(self):
-        """Get the nlp object."""
+        """Get the nlp object, applying the tuned thread count when the model is first loaded."""
         if self.nlp is None:
+            from story_wrapper.autotune import set_num_threads
             self.nlp = load_model()
+            # The thread count is process wide so it is set once here rather than on each read
+            set_num_threads(self.get_tuned_settings().get('n_threads'))
         return self.nlp
 
+    def get_tuned_settings(self) -> dict:
+        """Get the saved autotune settings for the current model on this host, or an empty dict."""
+        from story_wrapper.autotune import load_settings, model_key
+        model = model_key(self.get_nlp())
+        if self.tuned_model != model:
+            self.tuned_settings = load_settings(model) or {}
+            self.tuned_model = model
+            if self.tuned_settings:
+                logging.info(
+                    f"Using tuned batch_size {self.tuned_settings['batch_size']} "
+                    f"and n_process {self.tuned_settings['n_process']} for {model}"
+                )
+        return self.tuned_settings
+
+    def get_pipe_settings(self) -> dict:
+        """Get the nlp.pipe arguments tuned for the current model on this host, if any."""
+        settings = self.get_tuned_settings()
+        return {key: settings[key] for key in ('batch_size', 'n_process') if key in settings}
+
 
 nlp_service = NLPService()
+
+
+def instrument_loaded_model():
+    """Time the components of the model already loaded by `nlp_service`, if any."""
+    if nlp_service.nlp is not None:
+        instrument_pipeline(nlp_service.nlp)
+
+
+instrumentation.add_enable_hook(instrument_loaded_model)
@@ -0,0 +1,6 @@
+"""Run the lightweight data loader command line tools."""
+import sys
+from story_wrapper.data_loaders.cli import main
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -1,6 +1,8 @@
 # Based on https://github.com/JonathanReeve/chapterize/blob/master/chapterize/chapterize.py
+from typing import Dict, List, Optional, Tuple
 import logging
 import re
+from story_wrapper.instrumentation import instrumentation
 
 
 def zero_pad(numbers):
@@ -15,23 +17,35 @@ def zero_pad(numbers):
 
 
 class Book:
-    def __init__(self, book_id: int, text: str):
-        self.book_id = book_id
-        self.end_location = None
-        self.end_line = None
-        self.contents = text
-        self.lines = self.get_lines()
-        self.headings = self.get_headings()
-        # Alias for historical reasons. FIXME
-        self.heading_locations = self.headings
-        self.ignore_toc()
-        logging.info('Heading locations: %s' % self.heading_locations)
-        headings_plain = [self.lines[loc] for loc in self.heading_locations]
-        logging.info('Headings: %s' % headings_plain)
-        self.chapters = self.get_text_between_headings()
-        # logging.info('Chapters: %s' % self.chapters)
-        self.num_chapters = len(self.chapters)
-        self.paragraphs = self.get_paragraphs()
+    def __init__(self, book_id: int, text: str, segmentation: Optional[Dict] = None):
+        """
+        Segments the text into chapters and paragraphs. A segmentation from
+        `get_segmentation` can be passed to skip heading detection.
+        """
+        with instrumentation.stage('book.segmentation') as stage:
+            self.book_id = book_id
+            self.end_location = None
+            self.end_line = None
+            self.contents = text
+            self.lines = self.get_lines()
+            if segmentation is None:
+                self.headings = self.get_headings()
+                # Alias for historical reasons. FIXME
+                self.heading_locations = self.headings
+                self.ignore_toc()
+            else:
+                self.headings = list(segmentation['heading_locations'])
+                self.heading_locations = self.headings
+                self.end_location = segmentation['end_location']
+                self.end_line = segmentation['end_line']
+            logging.info('Heading locations: %s' % self.heading_locations)
+            headings_plain = [self.lines[loc] for loc in self.heading_locations]
+            logging.info('Headings: %s' % headings_plain)
+            self.chapters = self.get_text_between_headings()
+            # logging.info('Chapters: %s' % self.chapters)
+            self.num_chapters = len(self.chapters)
+            self.paragraphs = self.get_paragraphs(segmentation['paragraph_spans'] if segmentation else None)
+            stage.items = len(self.paragraphs)
 
     def get_lines(self):
         """
@@ -161,22 +175,50 @@ class Book:
                 chapters[i]['text'] = self.lines[headingLocation + 1:self.heading_locations[i+1]]
         return chapters
 
-    def get_paragraphs(self):
+    def get_paragraph_spans(self) -> List[List[Tuple[int, int]]]:
         """
-        Returns a list of paragraphs.
+        Returns the (start, end) line numbers of the paragraphs in each chapter.
+        A paragraph is a run of non-blank lines.
         """
+        spans = []
         for chapter_idx in self.chapters:
-            paragraphs = []
-            line_group = []
-            for line in self.chapters[chapter_idx]['text']:
+            first_line = self.heading_locations[chapter_idx] + 1
+            chapter_spans = []
+            start = None
+            for offset, line in enumerate(self.chapters[chapter_idx]['text']):
                 if line.strip() != '':
-                    line_group.append(line)
-                elif line_group:
-                    paragraphs.append(" ".join(line_group).strip())
-                    line_group = []
+                    if start is None:
+                        start = first_line + offset
+                elif start is not None:
+                    chapter_spans.append((start, first_line + offset))
+                    start = None
             # Add the last line group.
-            if line_group and line != '':
-                paragraphs.append(" ".join(line_group).strip())
-            self.chapters[chapter_idx]['paragraphs'] = paragraphs
+            if start is not None:
+                chapter_spans.append((start, first_line + len(self.chapters[chapter_idx]['text'])))
+            spans.append(chapter_spans)
+        return spans
+
+    def get_paragraphs(self, paragraph_spans: Optional[List[List[Tuple[int, int]]]] = None):
+        """
+        Returns a list of paragraphs.
+        """
+        if paragraph_spans is None:
+            paragraph_spans = self.get_paragraph_spans()
+        self.paragraph_spans = paragraph_spans
+        for chapter_idx, chapter_spans in zip(self.chapters, paragraph_spans):
+            self.chapters[chapter_idx]['paragraphs'] = [
+                " ".join(self.lines[start:end]).strip() for start, end in chapter_spans
+            ]
         return [p for chapter_idx in self.chapters for p in self.chapters[chapter_idx]['paragraphs']]
 
+    def get_segmentation(self) -> Dict:
+        """
+        Returns the heading, end and paragraph locations, which can be passed
+        back to the constructor to rebuild the book without detecting headings.
+        """
+        return {
+            'heading_locations': list(self.heading_locations),
+            'end_location': self.end_location,
+            'end_line': self.end_line,
+            'paragraph_spans': self.paragraph_spans,
+        }
@@ -0,0 +1,165 @@
+"""Caches for Book objects and their segmentation.
+
+    BookCache keeps recently used Book objects in memory, bounded by the total
+    size of the text they hold - the contents, their lines and the paragraphs. SegmentationCache persists the result of heading and
+    paragraph detection on disk, keyed by book id and the modification time of
+    the book file, so a Book can be rebuilt without rerunning `get_headings`
+    and `ignore_toc`.
+
+"""
+from typing import Dict, Optional
+from collections import OrderedDict
+import logging
+import os
+import pickle
+import sys
+import threading
+from story_wrapper.data_loaders.book import Book
+
+# Default bound on the memory held by the in-memory book cache
+BOOK_CACHE_BYTES = 256 * 1024 * 1024
+# Bump when the stored segmentation format changes to invalidate old entries
+SEGMENTATION_VERSION = 1
+
+
+def book_size(book: Book) -> int:
+    """Return the size in bytes of the text held by a book.
+
+    Counts the contents, the list of lines, the chapter line lists (which share
+    the line strings) and the paragraphs - together about three times the contents.
+    """
+    size = sys.getsizeof(book.contents)
+    size += sys.getsizeof(book.lines) + sum(sys.getsizeof(line) for line in book.lines)
+    size += sum(sys.getsizeof(chapter['text']) for chapter in book.chapters.values())
+    size += sys.getsizeof(book.paragraphs) + sum(sys.getsizeof(paragraph) for paragraph in book.paragraphs)
+    return size
+
+
+class BookCache:
+    """In-memory LRU cache of Book objects bounded by the total bytes of text they hold."""
+
+    def __init__(self, max_bytes: int = BOOK_CACHE_BYTES):
+        """Initialize the cache."""
+        self.max_bytes = max_bytes
+        self.size_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._books: "OrderedDict[int, Book]" = OrderedDict()
+        # Sizes are kept so they are only computed once per book
+        self._sizes: Dict[int, int] = {}
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        """Return the number of cached books."""
+        return len(self._books)
+
+    def __contains__(self, book_id: int) -> bool:
+        """Return True if the book is cached."""
+        return book_id in self._books
+
+    def get(self, book_id: int) -> Optional[Book]:
+        """Return the cached book, or None if it is not cached."""
+        with self._lock:
+            book = self._books.get(book_id)
+            if book is None:
+                self.misses += 1
+                return None
+            self._books.move_to_end(book_id)
+            self.hits += 1
+            return book
+
+    def put(self, book: Book):
+        """Cache a book, evicting the least recently used books to stay within max_bytes."""
+        size = book_size(book)
+        if size > self.max_bytes:
+            logging.debug(f"Book {book.book_id} is too large to cache.")
+            return
+        with self._lock:
+            if book.book_id in self._books:
+                del self._books[book.book_id]
+                self.size_bytes -= self._sizes.pop(book.book_id)
+            self._books[book.book_id] = book
+            self._sizes[book.book_id] = size
+            self.size_bytes += size
+            while self.size_bytes > self.max_bytes:
+                evicted_id, _ = self._books.popitem(last=False)
+                self.size_bytes -= self._sizes.pop(evicted_id)
+                self.evictions += 1
+
+    def clear(self):
+        """Remove all books from the cache."""
+        with self._lock:
+            self._books.clear()
+            self._sizes.clear()
+            self.size_bytes = 0
+
+    def stats(self) -> Dict:
+        """Return hit, miss and eviction counts and the current size."""
+        return {
+            'entries': len(self._books),
+            'size_bytes': self.size_bytes,
+            'max_bytes': self.max_bytes,
+            'hits': self.hits,
+            'misses': self.misses,
+            'evictions': self.evictions,
+        }
+
+
+class SegmentationCache:
+    """On-disk cache of Book segmentation results keyed by book id and file mtime."""
+
+    def __init__(self, path: str):
+        """Initialize the cache in the folder at path, which is created on first write."""
+        self.path = path
+        self.hits = 0
+        self.misses = 0
+        self.stale = 0
+        self.writes = 0
+
+    def get_path(self, book_id: int) -> str:
+        """Return the path of the cache file for a book."""
+        return os.path.join(self.path, f"{book_id}.pickle")
+
+    def get(self, book_id: int, mtime: float) -> Optional[Dict]:
+        """Return the cached segmentation, or None if it is missing or out of date."""
+        try:
+            with open(self.get_path(book_id), 'rb') as cache_file:
+                entry = pickle.load(cache_file)
+        except FileNotFoundError:
+            self.misses += 1
+            return None
+        except (pickle.UnpicklingError, EOFError) as e:
+            logging.warning(f"Ignoring corrupt segmentation cache for book {book_id}: {e!r}")
+            self.misses += 1
+            return None
+        if entry.get('version') != SEGMENTATION_VERSION or entry.get('mtime') != mtime:
+            self.stale += 1
+            self.misses += 1
+            return None
+        self.hits += 1
+        return entry['segmentation']
+
+    def put(self, book_id: int, mtime: float, segmentation: Dict):
+        """Save the segmentation of a book."""
+        os.makedirs(self.path, exist_ok=True)
+        path = self.get_path(book_id)
+        # Write to a temporary file first so readers never see a partial entry
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        with open(tmp_path, 'wb') as cache_file:
+            pickle.dump({
+                'version': SEGMENTATION_VERSION,
+                'mtime': mtime,
+                'segmentation': segmentation,
+            }, cache_file, protocol=-1)
+        os.replace(tmp_path, path)
+        self.writes += 1
+
+    def stats(self) -> Dict:
+        """Return hit, miss and write counts."""
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'stale': self.stale,
+            'writes': self.writes,
+        }
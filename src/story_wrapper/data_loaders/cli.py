@@ -0,0 +1,97 @@
+"""Lightweight command line tools for Gutenberg metadata and books.
+
+    These never import spaCy, so they start quickly.
+
+    Usage:
+        python -m story_wrapper.data_loaders ids
+        python -m story_wrapper.data_loaders metadata 1342
+        python -m story_wrapper.data_loaders book 1342
+        python -m story_wrapper.data_loaders book path/to/book.txt --paragraphs
+
+"""
+from typing import List, Optional
+import argparse
+import json
+import os
+import sys
+import zipfile
+from story_wrapper.data_loaders.book import Book
+from story_wrapper.data_loaders.gutenberg import CURRENT_FOLDER, Gutenberg
+
+
+def to_json(value) -> str:
+    """Serialise metadata, which contains sets, as JSON."""
+    return json.dumps(value, indent=2, default=lambda o: sorted(o) if isinstance(o, set) else str(o))
+
+
+def read_book_file(path: str) -> str:
+    """Read the text of a book from a .txt file or a zipped Gutenberg book."""
+    if zipfile.is_zipfile(path):
+        with zipfile.ZipFile(path, 'r') as book_zip:
+            name = next(name for name in book_zip.namelist() if name.endswith('.txt'))
+            return book_zip.read(name).decode()
+    with open(path, errors='ignore') as book_file:
+        return book_file.read()
+
+
+def cmd_ids(gutenberg: Gutenberg, args) -> int:
+    """Print the ids of the books in the fiction index."""
+    for book_id in sorted(gutenberg.get_ids()):
+        print(book_id)
+    return 0
+
+
+def cmd_metadata(gutenberg: Gutenberg, args) -> int:
+    """Print the metadata of a book."""
+    book = gutenberg.fiction_md.get(args.book_id) if not args.all else gutenberg.metadata.get(args.book_id)
+    if book is None:
+        print(f"Book {args.book_id} not found.", file=sys.stderr)
+        return 1
+    print(to_json(book))
+    return 0
+
+
+def cmd_book(gutenberg: Gutenberg, args) -> int:
+    """Segment a book, given as an id in the fiction index or a path, and print a summary."""
+    if os.path.exists(args.book):
+        book = Book(0, read_book_file(args.book))
+    else:
+        book = gutenberg.get_book_object(int(args.book))
+    if args.paragraphs:
+        for paragraph in book.paragraphs:
+            print(paragraph)
+            print()
+        return 0
+    print(to_json({
+        'book_id': book.book_id,
+        'num_chapters': book.num_chapters,
+        'num_paragraphs': len(book.paragraphs),
+        'end_line': book.end_line,
+        'headings': [chapter['heading'] for chapter in book.chapters.values()],
+    }))
+    return 0
+
+
+def parse_args(argv: Optional[List[str]] = None):
+    """Parse command line arguments."""
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--data-path', default="~/data/gutenberg", help="Path of the mirrored corpus.")
+    parser.add_argument('--index-path', default=CURRENT_FOLDER, help="Folder containing the indexes folder.")
+    subparsers = parser.add_subparsers(dest='command', required=True)
+    subparsers.add_parser('ids', help=cmd_ids.__doc__).set_defaults(func=cmd_ids)
+    metadata = subparsers.add_parser('metadata', help=cmd_metadata.__doc__)
+    metadata.add_argument('book_id', type=int)
+    metadata.add_argument('--all', action='store_true', help="Look in the whole catalogue, not just fiction.")
+    metadata.set_defaults(func=cmd_metadata)
+    book = subparsers.add_parser('book', help=cmd_book.__doc__)
+    book.add_argument('book', help="Book id or path to a .txt or .zip file.")
+    book.add_argument('--paragraphs', action='store_true', help="Print the paragraphs instead of a summary.")
+    book.set_defaults(func=cmd_book)
+    return parser.parse_args(argv)
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    """Run a command."""
+    args = parse_args(argv)
+    gutenberg = Gutenberg(data_path=args.data_path, index_path=args.index_path)
+    return args.func(gutenberg, args)
@@ -0,0 +1,270 @@
+"""Near-duplicate detection for books using MinHash signatures and LSH.
+
+    The Gutenberg mirror contains re-releases, alternative editions and collections
+    that repeat the same text under different ids. Each book is reduced to a short
+    MinHash signature over word shingles of its paragraphs, and a banded
+    locality-sensitive hashing (LSH) index is used to find candidate duplicates
+    without comparing every pair of books.
+
+    Signatures use one-permutation hashing with rotation densification
+    (Shrivastava & Li, 2014), so each shingle is hashed once rather than once
+    per permutation. Shingle hashes are built from a CRC32 of each distinct
+    word, combined and mixed in bulk with NumPy.
+
+"""
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+from collections import defaultdict
+import logging
+import pickle
+import gzip
+import os
+import re
+import zlib
+
+# Number of bins in a signature
+NUM_PERM = 128
+# Number of LSH bands - NUM_PERM must be divisible by this
+NUM_BANDS = 16
+# Number of words in a shingle
+SHINGLE_SIZE = 5
+# Minimum estimated Jaccard similarity for two books to count as duplicates
+THRESHOLD = 0.8
+
+# Bump when the way signatures are computed changes, so saved signatures are recomputed
+SIGNATURE_VERSION = 2
+
+# Marker for bins that received no shingle
+EMPTY_BIN = (1 << 64) - 1
+# Odd multiplier combining the word hashes of a shingle
+MULTIPLIER = 0x9E3779B97F4A7C15
+# Added to a borrowed value once per bin of rotation, so densified bins rarely collide
+ROTATION_OFFSET = 0xC2B2AE3D27D4EB4F
+
+WORD = re.compile(r"\w+")
+
+
+def shingles(paragraphs: Iterable[str], size: int = SHINGLE_SIZE) -> Set[str]:
+    """Return the set of lower-cased word shingles for a list of paragraphs."""
+    words = [word for paragraph in paragraphs for word in WORD.findall(paragraph.lower())]
+    if len(words) < size:
+        return {" ".join(words)} if words else set()
+    return {" ".join(words[i:i + size]) for i in range(len(words) - size + 1)}
+
+
+def shingle_hashes(paragraphs: Iterable[str], size: int = SHINGLE_SIZE):
+    """Return a uint64 NumPy array with a hash of each shingle of a list of paragraphs.
+
+    Each distinct word is hashed once; shingle hashes are then combined from the
+    word hashes in bulk, and only need to be consistent, not cryptographic.
+    """
+    import numpy as np
+    word_ids: Dict[str, int] = {}
+    ids = [
+        word_ids.setdefault(word, len(word_ids))
+        for paragraph in paragraphs for word in WORD.findall(paragraph.lower())
+    ]
+    if not ids:
+        return np.empty(0, dtype=np.uint64)
+    word_hashes = np.array([zlib.crc32(word.encode()) for word in word_ids], dtype=np.uint64)
+    hashes = word_hashes[np.array(ids)]
+    # Books shorter than a shingle are a single shingle of all their words, as in `shingles`
+    size = min(size, len(ids))
+    count = len(ids) - size + 1
+    combined = np.zeros(count, dtype=np.uint64)
+    for offset in range(size):
+        combined = combined * np.uint64(MULTIPLIER) + hashes[offset:offset + count]
+    # SplitMix64 finaliser, so the low bits used for the bin are well mixed
+    combined ^= combined >> np.uint64(30)
+    combined *= np.uint64(0xBF58476D1CE4E5B9)
+    combined ^= combined >> np.uint64(27)
+    combined *= np.uint64(0x94D049BB133111EB)
+    combined ^= combined >> np.uint64(31)
+    return combined
+
+
+def minhash_signature(paragraphs: Iterable[str], num_perm: int = NUM_PERM,
+                      size: int = SHINGLE_SIZE) -> Tuple[int, ...]:
+    """Compute a one-permutation MinHash signature for a list of paragraphs."""
+    import numpy as np
+    values = shingle_hashes(paragraphs, size)
+    bins = np.full(num_perm, EMPTY_BIN, dtype=np.uint64)
+    np.minimum.at(bins, (values % np.uint64(num_perm)).astype(np.intp), values)
+    signature = [int(value) for value in bins]
+    if is_empty_signature(signature):
+        return tuple(signature)
+    # Densify - fill each empty bin from the next non-empty bin to its right, shifted by
+    # the rotation distance so two books only match there if the donors match at the same distance
+    densified = list(signature)
+    for i in range(num_perm):
+        offset = 1
+        while densified[i] == EMPTY_BIN:
+            donor = signature[(i + offset) % num_perm]
+            if donor != EMPTY_BIN:
+                value = (donor + offset * ROTATION_OFFSET) & EMPTY_BIN
+                densified[i] = value if value != EMPTY_BIN else 0
+            offset += 1
+    return tuple(densified)
+
+
+def is_empty_signature(signature: Tuple[int, ...]) -> bool:
+    """Return True if a signature received no shingles, as for a book with no paragraphs."""
+    return all(value == EMPTY_BIN for value in signature)
+
+
+def jaccard(signature_a: Tuple[int, ...], signature_b: Tuple[int, ...]) -> float:
+    """Estimate the Jaccard similarity of two books from their signatures."""
+    if len(signature_a) != len(signature_b):
+        raise ValueError("Signatures must have the same length.")
+    matches = sum(1 for a, b in zip(signature_a, signature_b) if a == b)
+    return matches / len(signature_a)
+
+
+class SignatureIndex:
+    """LSH index of book signatures used to group near-duplicate books."""
+
+    def __init__(self, num_perm: int = NUM_PERM, num_bands: int = NUM_BANDS, threshold: float = THRESHOLD):
+        """Initialize the index."""
+        if num_perm % num_bands:
+            raise ValueError("num_perm must be divisible by num_bands.")
+        self.num_perm = num_perm
+        self.num_bands = num_bands
+        self.rows = num_perm // num_bands
+        self.threshold = threshold
+        self.signatures: Dict[int, Tuple[int, ...]] = {}
+        # Books already found to have no paragraphs, so they are not loaded again
+        self.empty: Set[int] = set()
+        self.buckets: List[Dict[Tuple[int, ...], Set[int]]] = [defaultdict(set) for _ in range(num_bands)]
+        # Incremented on every change, so results derived from the index can be cached
+        self.version = 0
+        self._groups: Optional[List[List[int]]] = None
+
+    def __len__(self) -> int:
+        """Return the number of books in the index."""
+        return len(self.signatures)
+
+    def __contains__(self, book_id: int) -> bool:
+        """Return True if the book has a signature in the index."""
+        return book_id in self.signatures
+
+    def is_indexed(self, book_id: int) -> bool:
+        """Return True if the book has a signature or was found to have no paragraphs."""
+        return book_id in self.signatures or book_id in self.empty
+
+    def bands(self, signature: Tuple[int, ...]) -> List[Tuple[int, ...]]:
+        """Split a signature into its LSH bands."""
+        return [signature[i * self.rows:(i + 1) * self.rows] for i in range(self.num_bands)]
+
+    def add(self, book_id: int, signature: Tuple[int, ...]):
+        """Add a book signature to the index, replacing any previous signature.
+
+        Empty signatures are rejected - they are all identical, so every book
+        without text would be grouped as a duplicate of every other.
+        """
+        if len(signature) != self.num_perm:
+            raise ValueError(f"Expected a signature of length {self.num_perm}.")
+        if is_empty_signature(signature):
+            raise ValueError(f"Signature for book {book_id} is empty.")
+        if book_id in self.signatures:
+            self.remove(book_id)
+        self.signatures[book_id] = signature
+        for band_idx, band in enumerate(self.bands(signature)):
+            self.buckets[band_idx][band].add(book_id)
+        self._changed()
+
+    def remove(self, book_id: int):
+        """Remove a book from the index."""
+        signature = self.signatures.pop(book_id)
+        for band_idx, band in enumerate(self.bands(signature)):
+            bucket = self.buckets[band_idx][band]
+            bucket.discard(book_id)
+            if not bucket:
+                del self.buckets[band_idx][band]
+        self._changed()
+
+    def _changed(self):
+        self.version += 1
+        self._groups = None
+
+    def candidates(self, book_id: int) -> Set[int]:
+        """Return ids of books sharing at least one LSH band with the given book."""
+        found = set()
+        for band_idx, band in enumerate(self.bands(self.signatures[book_id])):
+            found.update(self.buckets[band_idx].get(band, ()))
+        found.discard(book_id)
+        return found
+
+    def duplicates(self, book_id: int) -> List[int]:
+        """Return ids of books whose estimated similarity meets the threshold."""
+        signature = self.signatures[book_id]
+        return sorted(
+            candidate for candidate in self.candidates(book_id)
+            if jaccard(signature, self.signatures[candidate]) >= self.threshold
+        )
+
+    def groups(self) -> List[List[int]]:
+        """Return groups of two or more near-duplicate book ids, each sorted.
+
+        The groups are cached until the index next changes.
+        """
+        if self._groups is None:
+            self._groups = self._find_groups()
+        return [list(group) for group in self._groups]
+
+    def _find_groups(self) -> List[List[int]]:
+        # Union-find over the verified duplicate pairs
+        parent = {book_id: book_id for book_id in self.signatures}
+
+        def find(book_id):
+            while parent[book_id] != book_id:
+                parent[book_id] = parent[parent[book_id]]
+                book_id = parent[book_id]
+            return book_id
+
+        for book_id in self.signatures:
+            for duplicate in self.duplicates(book_id):
+                root_a, root_b = find(book_id), find(duplicate)
+                if root_a != root_b:
+                    parent[max(root_a, root_b)] = min(root_a, root_b)
+
+        grouped = defaultdict(list)
+        for book_id in self.signatures:
+            grouped[find(book_id)].append(book_id)
+        return sorted(sorted(group) for group in grouped.values() if len(group) > 1)
+
+    def save(self, path: str):
+        """Save the signatures to a gzipped pickle."""
+        with gzip.open(path, 'wb') as index_file:
+            pickle.dump({
+                'version': SIGNATURE_VERSION,
+                'num_perm': self.num_perm,
+                'num_bands': self.num_bands,
+                'threshold': self.threshold,
+                'signatures': self.signatures,
+                'empty': self.empty,
+            }, index_file, protocol=-1)
+
+    @classmethod
+    def load(cls, path: str, threshold: Optional[float] = None) -> "SignatureIndex":
+        """Load signatures saved with `save` and rebuild the LSH buckets."""
+        with gzip.open(path, 'rb') as index_file:
+            data = pickle.load(index_file)
+        index = cls(
+            num_perm=data['num_perm'],
+            num_bands=data['num_bands'],
+            threshold=data['threshold'] if threshold is None else threshold
+        )
+        if data.get('version') != SIGNATURE_VERSION:
+            logging.warning(f"Signatures in {path} were computed differently and will be recomputed.")
+            return index
+        index.empty = set(data['empty'])
+        for book_id, signature in data['signatures'].items():
+            index.add(book_id, signature)
+        logging.info(f"Loaded {len(index)} book signatures from {path}.")
+        return index
+
+    @classmethod
+    def load_or_create(cls, path: str) -> "SignatureIndex":
+        """Load the index at path if it exists, otherwise return an empty index."""
+        if os.path.exists(path):
+            return cls.load(path)
+        return cls()
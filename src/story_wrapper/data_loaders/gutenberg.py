@@ -4,7 +4,7 @@
     https://github.com/benhoyle/gutenberg/blob/master/Get%20List%20of%20Fiction%20Titles.ipynb
 
 """
-from typing import List, Tuple
+from typing import Dict, Hashable, Iterable, Iterator, List, Optional, Tuple
 import logging
 import subprocess
 import pickle
@@ -14,6 +14,10 @@ import zipfile
 import random
 from story_wrapper.data_loaders.parseRDF import readmetadata
 from story_wrapper.data_loaders.book import Book
+from story_wrapper.data_loaders.cache import BOOK_CACHE_BYTES, BookCache, SegmentationCache
+from story_wrapper.data_loaders.dedup import SignatureIndex, is_empty_signature, minhash_signature
+from story_wrapper.data_loaders.sampling import BookSampler
+from story_wrapper.instrumentation import instrumentation
 
 # Get path of current folder
 CURRENT_FOLDER = os.path.dirname(os.path.abspath(__file__))
@@ -22,19 +26,80 @@ CURRENT_FOLDER = os.path.dirname(os.path.abspath(__file__))
 class Gutenberg:
     """Class to mirror the Gutenberg corpus locally."""
 
-    def __init__(self, data_path: str = "~/data/gutenberg", index_path: str = CURRENT_FOLDER):
-        """Initialize the class."""
+    def __init__(self, data_path: str = "~/data/gutenberg", index_path: str = CURRENT_FOLDER,
+                 book_cache_bytes: int = BOOK_CACHE_BYTES, cache_segmentation: bool = True):
+        """Initialize the class.
+
+        Recently used books are kept in memory up to `book_cache_bytes` of text, counting
+        their lines and paragraphs as well as the contents. With `cache_segmentation`,
+        book segmentation is saved in the indexes folder.
+        """
         if "~" in data_path:
             data_path = os.path.expanduser(data_path)
         self.data_path = data_path
         self.index_path = os.path.join(index_path, "indexes", "fiction_index.gz")
-        self.fiction_md = None
-        # Get indexes of Gutenberg corpus via ParseRDF functions
-        logging.info("Indexing Gutenberg corpus.")
-        self.metadata = readmetadata()
-        logging.info("Indexing complete.")
-        logging.info("Number of books in Gutenberg corpus: {}".format(len(self.metadata)))
-        # Extract the fiction corpus
+        self.signature_index_path = os.path.join(index_path, "indexes", "signature_index.gz")
+        # Indexes are loaded on first use so that constructing the class is cheap
+        self._metadata = None
+        self._fiction_md = None
+        self._signature_index = None
+        # Canonical id mapping and the signature index version it was computed for
+        self._canonical_ids = None
+        self._canonical_version = None
+        self._sampler = None
+        self.book_cache = BookCache(book_cache_bytes)
+        self.segmentation_cache = None
+        if cache_segmentation:
+            self.segmentation_cache = SegmentationCache(os.path.join(index_path, "indexes", "segmentation"))
+
+    @property
+    def metadata(self) -> Dict[int, Dict]:
+        """Metadata for the whole Gutenberg corpus, loaded on first use."""
+        if self._metadata is None:
+            # Get indexes of Gutenberg corpus via ParseRDF functions
+            logging.info("Indexing Gutenberg corpus.")
+            self._metadata = readmetadata()
+            logging.info("Indexing complete.")
+            logging.info("Number of books in Gutenberg corpus: {}".format(len(self._metadata)))
+        return self._metadata
+
+    @property
+    def fiction_md(self) -> Dict[int, Dict]:
+        """Metadata for the English fiction corpus, loaded or built on first use."""
+        if self._fiction_md is None:
+            self.load_fiction_index()
+        return self._fiction_md
+
+    @fiction_md.setter
+    def fiction_md(self, fiction_md: Dict[int, Dict]):
+        self._fiction_md = fiction_md
+        self._sampler = None
+        self._canonical_ids = None
+
+    @property
+    def sampler(self) -> BookSampler:
+        """Sampler over the fiction index, built on first use.
+
+        It is rebuilt when fiction_md is replaced or books are added or removed. Call
+        `reset_sampler` after editing the metadata of books already in the index.
+        """
+        if self._sampler is None or len(self._sampler) != len(self.fiction_md):
+            self._sampler = BookSampler(self.fiction_md)
+        return self._sampler
+
+    def reset_sampler(self):
+        """Rebuild the sampler on next use, after fiction_md has been changed in place."""
+        self._sampler = None
+
+    @property
+    def signature_index(self) -> SignatureIndex:
+        """Near-duplicate signatures, persisted next to the fiction index and loaded on first use."""
+        if self._signature_index is None:
+            self._signature_index = SignatureIndex.load_or_create(self.signature_index_path)
+        return self._signature_index
+
+    def load_fiction_index(self):
+        """Load the fiction index, extracting it from the corpus metadata if it has not been saved."""
         if not os.path.exists(self.index_path):
             logging.info("Extracting fiction corpus.")
             self.parse_fiction()
@@ -110,23 +175,70 @@ class Gutenberg:
                 self.fiction_md[int(bookid)]['path'] = path
             except KeyError:
                 logging.debug(f"Book {bookid} not in fiction index.")
+        self.reset_sampler()
 
     def get_book_text(self, book_id: int) -> str:
         """Get the text of a book from a synced database."""
         book = self.fiction_md.get(book_id, None)
         if book:
-            with zipfile.ZipFile(book['path'], 'r') as book_zip:
-                # We might want to change this to open the one txt file in the zip
-                with book_zip.open('{0}.txt'.format(book['id'])) as txtfile:
-                    text = txtfile.read().decode()
+            with instrumentation.stage('gutenberg.zip_read', items=1):
+                with zipfile.ZipFile(book['path'], 'r') as book_zip:
+                    # We might want to change this to open the one txt file in the zip
+                    with book_zip.open('{0}.txt'.format(book['id'])) as txtfile:
+                        data = txtfile.read()
+            with instrumentation.stage('gutenberg.decode', items=1):
+                text = data.decode()
         else:
             raise FileNotFoundError
         return text
 
+    def get_book_mtime(self, book_id: int) -> Optional[float]:
+        """Get the modification time of a book file, or None if it has no file."""
+        path = self.fiction_md.get(book_id, {}).get('path')
+        if path is None or not os.path.exists(path):
+            return None
+        return os.path.getmtime(path)
+
     def get_book_object(self, book_id: int) -> Book:
-        """Get the book object from the index."""
+        """Get the book object from the index.
+
+        Books are cached, so repeated calls return the same object.
+        """
+        book = self.book_cache.get(book_id)
+        if book is not None:
+            return book
         text = self.get_book_text(book_id)
-        return Book(book_id, text)
+        mtime = self.get_book_mtime(book_id) if self.segmentation_cache else None
+        segmentation = None
+        if mtime is not None:
+            segmentation = self.segmentation_cache.get(book_id, mtime)
+        book = Book(book_id, text, segmentation=segmentation)
+        if mtime is not None and segmentation is None:
+            self.segmentation_cache.put(book_id, mtime, book.get_segmentation())
+        self.book_cache.put(book)
+        return book
+
+    def add_signature(self, book: Book) -> bool:
+        """Add the near-duplicate signature of a book to the index. Returns False if it has no paragraphs.
+
+        Books where no chapters were found have no paragraphs, and are left out of
+        the index rather than all being grouped as duplicates of each other. They
+        are recorded so that they are not loaded again.
+        """
+        signature = minhash_signature(book.paragraphs)
+        if is_empty_signature(signature):
+            logging.info(f"Book {book.book_id} has no paragraphs - not adding it to the signature index.")
+            self.signature_index.empty.add(book.book_id)
+            return False
+        self.signature_index.add(book.book_id, signature)
+        return True
+
+    def cache_stats(self) -> Dict[str, Dict]:
+        """Get hit, miss and eviction counts for the book and segmentation caches."""
+        return {
+            'books': self.book_cache.stats(),
+            'segmentation': self.segmentation_cache.stats() if self.segmentation_cache else None,
+        }
 
     def get_ids(self) -> List[int]:
         """Get a list of book ids."""
@@ -134,5 +246,78 @@ class Gutenberg:
 
     def get_random_book(self) -> Book:
         """Get a random book."""
-        book_id = random.choice(self.get_ids())
+        book_id = random.choice(self.sampler.ids)
         return self.get_book_object(book_id)
+
+    def sample_ids(self, n: int, weighted: bool = True, replace: bool = True, seed: Optional[int] = None,
+                   stratum: Optional[Hashable] = None, key: Optional[str] = None) -> List[int]:
+        """Sample book ids, weighted by downloads unless weighted is False, optionally within a stratum.
+
+        Stratum keys are 'subject', 'LCC', 'author' and 'era' (of the author's birth).
+        """
+        return self.sampler.sample(n, weighted, replace, seed, stratum, key)
+
+    def sample_books(self, n: int, **kwargs) -> Iterator[Book]:
+        """Sample books as for sample_ids, loading each book only when it is reached."""
+        return (self.get_book_object(book_id) for book_id in self.sample_ids(n, **kwargs))
+
+    def stratified_sample_ids(self, n_per_stratum: int, key: str, **kwargs) -> Dict[Hashable, List[int]]:
+        """Sample up to n_per_stratum book ids from every stratum of a key."""
+        return self.sampler.stratified_sample(n_per_stratum, key, **kwargs)
+
+    def build_signature_index(self, book_ids: Optional[Iterable[int]] = None, save: bool = True):
+        """Compute near-duplicate signatures for books that do not have one yet.
+
+        Signatures are only computed here, at ingest, not each time a book is loaded.
+        """
+        if book_ids is None:
+            book_ids = self.get_ids()
+        for book_id in book_ids:
+            if self.signature_index.is_indexed(book_id):
+                continue
+            try:
+                self.add_signature(self.get_book_object(book_id))
+            except (FileNotFoundError, KeyError, zipfile.BadZipFile, UnicodeDecodeError) as e:
+                logging.warning(f"Could not compute signature for book {book_id}: {e!r}")
+        logging.info(f"Signature index contains {len(self.signature_index)} books.")
+        if save:
+            self.save_signature_index()
+
+    def save_signature_index(self):
+        """Save the near-duplicate signature index next to the fiction index."""
+        logging.info("Saving signature index.")
+        self.signature_index.save(self.signature_index_path)
+
+    def get_duplicate_groups(self) -> List[List[int]]:
+        """Get groups of near-duplicate book ids, with the canonical id first."""
+        groups = []
+        for group in self.signature_index.groups():
+            canonical_id = self.choose_canonical_id(group)
+            groups.append([canonical_id] + [book_id for book_id in group if book_id != canonical_id])
+        return groups
+
+    def choose_canonical_id(self, book_ids: List[int]) -> int:
+        """Choose the canonical book from a group - most downloaded, then lowest id."""
+        return min(
+            book_ids,
+            key=lambda book_id: (-(self.fiction_md.get(book_id, {}).get('downloads') or 0), book_id)
+        )
+
+    def get_canonical_ids(self) -> Dict[int, int]:
+        """Get a mapping from each duplicated book id to the id of its canonical book."""
+        return dict(self._get_canonical_ids())
+
+    def get_canonical_id(self, book_id: int) -> int:
+        """Get the canonical id for a book, which is the book itself if it has no duplicates."""
+        return self._get_canonical_ids().get(book_id, book_id)
+
+    def _get_canonical_ids(self) -> Dict[int, int]:
+        # Cached until the signature index or fiction index changes, so lookups per book stay cheap
+        if self._canonical_ids is None or self._canonical_version != self.signature_index.version:
+            canonical_ids = {}
+            for group in self.get_duplicate_groups():
+                for book_id in group:
+                    canonical_ids[book_id] = group[0]
+            self._canonical_ids = canonical_ids
+            self._canonical_version = self.signature_index.version
+        return self._canonical_ids
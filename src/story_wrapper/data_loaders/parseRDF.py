@@ -33,7 +33,6 @@ import gzip
 import os
 import re
 import tarfile
-import requests
 import xml.etree.cElementTree as ElementTree
 
 # Get path of current folder
@@ -115,6 +114,8 @@ def getrdfdata():
 
 	"""
 	if not os.path.exists(RDFFILES):
+		# Only needed when the catalog has not been downloaded, so import on demand
+		import requests
 		logging.info('Downloading RDF files from %s', RDFURL)
 		r = requests.get(RDFURL)
 		with open(RDFFILES, 'wb') as f:
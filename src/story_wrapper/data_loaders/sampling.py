@@ -0,0 +1,180 @@
+"""Weighted and stratified sampling of book ids from the fiction index.
+
+    BookSampler precomputes, once per index, the array of book ids, an alias
+    table over their download counts and per-stratum id arrays (by subject,
+    LCC, author or author era), so each draw costs O(1).
+
+    >>> sampler = BookSampler(gutenberg.fiction_md)
+    >>> sampler.sample(1000, seed=42)
+    >>> sampler.sample(100, stratum='PR', key='LCC', replace=False, seed=42)
+    >>> sampler.stratified_sample(10, key='era', seed=42)
+
+"""
+from typing import Callable, Dict, Hashable, List, Optional, Sequence
+import heapq
+import random
+
+# Width in years of the author era strata
+ERA_YEARS = 50
+
+
+def author_era(book: Dict, years: int = ERA_YEARS) -> List[str]:
+    """Return the era of the author's birth, e.g. '1800-1849'."""
+    birth = book.get('authoryearofbirth')
+    if birth is None:
+        return ['unknown']
+    start = birth // years * years
+    return [f"{start}-{start + years - 1}"]
+
+
+# Functions returning the strata a book belongs to - a book may be in several
+STRATA: Dict[str, Callable[[Dict], List[Hashable]]] = {
+    'subject': lambda book: sorted(book.get('subjects') or []),
+    'LCC': lambda book: sorted(book.get('LCC') or []),
+    'author': lambda book: [book.get('author') or 'unknown'],
+    'era': author_era,
+}
+
+
+class AliasTable:
+    """Walker's alias method for O(1) sampling from a discrete distribution (Vose's construction)."""
+
+    def __init__(self, weights: Sequence[float]):
+        """Build the table from non-negative weights."""
+        n = len(weights)
+        total = float(sum(weights))
+        if n == 0 or total <= 0:
+            raise ValueError("Weights must contain at least one positive value.")
+        if any(weight < 0 for weight in weights):
+            raise ValueError("Weights must be non-negative.")
+        self.n = n
+        self.probability = [0.0] * n
+        self.alias = list(range(n))
+        scaled = [weight * n / total for weight in weights]
+        small = [i for i, value in enumerate(scaled) if value < 1.0]
+        large = [i for i, value in enumerate(scaled) if value >= 1.0]
+        while small and large:
+            less, more = small.pop(), large.pop()
+            self.probability[less] = scaled[less]
+            self.alias[less] = more
+            scaled[more] = scaled[more] + scaled[less] - 1.0
+            (small if scaled[more] < 1.0 else large).append(more)
+        # Anything left is 1 up to rounding error
+        for i in large + small:
+            self.probability[i] = 1.0
+
+    def draw(self, rng: random.Random) -> int:
+        """Draw one index."""
+        i = int(rng.random() * self.n)
+        return i if rng.random() < self.probability[i] else self.alias[i]
+
+
+class BookSampler:
+    """Seeded sampling of book ids, uniform or weighted by downloads, optionally within a stratum."""
+
+    def __init__(self, fiction_md: Dict[int, Dict], weight_field: str = 'downloads', smoothing: float = 1.0):
+        """Precompute the id array and the weights.
+
+        Each book is weighted by `weight_field` plus `smoothing`, so books without
+        downloads can still be drawn. The sampler is a snapshot - build a new one if
+        fiction_md changes.
+        """
+        self.fiction_md = fiction_md
+        self.ids = sorted(fiction_md)
+        self.weights = [float(fiction_md[book_id].get(weight_field) or 0) + smoothing for book_id in self.ids]
+        self._strata: Dict[str, Dict[Hashable, List[int]]] = {}
+        self._alias_tables: Dict[tuple, AliasTable] = {}
+
+    def __len__(self) -> int:
+        """Return the number of books that can be sampled."""
+        return len(self.ids)
+
+    def strata(self, key: str) -> Dict[Hashable, List[int]]:
+        """Return the positions of the books in each stratum for a key such as 'subject', 'LCC' or 'era'."""
+        if key not in self._strata:
+            if key not in STRATA:
+                raise KeyError(f"Unknown stratum key {key}, expected one of {sorted(STRATA)}.")
+            strata = {}
+            for position, book_id in enumerate(self.ids):
+                for stratum in STRATA[key](self.fiction_md[book_id]):
+                    strata.setdefault(stratum, []).append(position)
+            self._strata[key] = strata
+        return self._strata[key]
+
+    def population(self, stratum: Optional[Hashable] = None, key: Optional[str] = None) -> Sequence[int]:
+        """Return the positions of the books in a stratum, or of all books."""
+        if not self.ids:
+            raise ValueError("There are no books to sample.")
+        if stratum is None:
+            return range(len(self.ids))
+        if key is None:
+            raise ValueError("A stratum key is needed to sample from a stratum.")
+        try:
+            return self.strata(key)[stratum]
+        except KeyError:
+            raise KeyError(f"No books in stratum {stratum!r} for key {key}.") from None
+
+    def alias_table(self, stratum: Optional[Hashable] = None, key: Optional[str] = None) -> AliasTable:
+        """Return the alias table over the weights of a stratum, building it on first use."""
+        table_key = (key, stratum)
+        if table_key not in self._alias_tables:
+            positions = self.population(stratum, key)
+            self._alias_tables[table_key] = AliasTable([self.weights[position] for position in positions])
+        return self._alias_tables[table_key]
+
+    def sample(self, n: int, weighted: bool = True, replace: bool = True, seed: Optional[int] = None,
+               stratum: Optional[Hashable] = None, key: Optional[str] = None) -> List[int]:
+        """Sample n book ids, with or without replacement.
+
+        The same seed always gives the same sample for the same index.
+        """
+        rng = random.Random(seed)
+        positions = self.population(stratum, key)
+        if not replace and n > len(positions):
+            raise ValueError(f"Cannot sample {n} books without replacement from {len(positions)}.")
+        if not weighted:
+            if replace:
+                draws = [positions[int(rng.random() * len(positions))] for _ in range(n)]
+            else:
+                draws = rng.sample(positions, n)
+            return [self.ids[position] for position in draws]
+        table = self.alias_table(stratum, key)
+        if replace:
+            draws = [table.draw(rng) for _ in range(n)]
+        else:
+            draws = None
+            if n * 4 <= len(positions):
+                draws = self._draw_distinct(table, n, rng)
+            if draws is None:
+                # Efraimidis-Spirakis: keep the n largest random keys u ** (1 / weight)
+                draws = heapq.nlargest(
+                    n, range(len(positions)),
+                    key=lambda i: self.weights[positions[i]] and rng.random() ** (1.0 / self.weights[positions[i]])
+                )
+        return [self.ids[positions[draw]] for draw in draws]
+
+    @staticmethod
+    def _draw_distinct(table: AliasTable, n: int, rng: random.Random) -> Optional[List[int]]:
+        """Draw n distinct indices by rejecting repeats, giving up if the weights are too skewed."""
+        seen = set()
+        draws = []
+        for _ in range(10 * n + 100):
+            draw = table.draw(rng)
+            if draw not in seen:
+                seen.add(draw)
+                draws.append(draw)
+                if len(draws) == n:
+                    return draws
+        return None
+
+    def stratified_sample(self, n_per_stratum: int, key: str, weighted: bool = True, replace: bool = False,
+                          seed: Optional[int] = None, min_size: int = 1) -> Dict[Hashable, List[int]]:
+        """Sample up to n_per_stratum book ids from every stratum with at least min_size books."""
+        samples = {}
+        for i, (stratum, positions) in enumerate(sorted(self.strata(key).items(), key=lambda item: str(item[0]))):
+            if len(positions) < min_size:
+                continue
+            n = n_per_stratum if replace else min(n_per_stratum, len(positions))
+            stratum_seed = None if seed is None else seed + i
+            samples[stratum] = self.sample(n, weighted, replace, stratum_seed, stratum, key)
+        return samples
@@ -0,0 +1,288 @@
+"""Opt-in timing instrumentation for processing stages and spaCy pipeline components.
+
+    Stages are recorded with wall time, item counts and peak memory, and the aggregates
+    can be exported as JSON or Prometheus text. Instrumentation is off unless the
+    STORY_WRAPPER_INSTRUMENTATION environment variable is set or `instrumentation.enable()`
+    is called; when off, `stage()` returns a shared no-op context manager.
+
+    >>> from story_wrapper.instrumentation import instrumentation
+    >>> instrumentation.enable()
+    >>> with instrumentation.stage('my_stage') as stage:
+    ...     stage.items = 10
+    >>> instrumentation.stats()['my_stage']['items']
+    10
+
+"""
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional
+import json
+import logging
+import os
+import sys
+import threading
+import time
+
+try:
+    import resource
+except ImportError:  # Not available on Windows
+    resource = None
+
+# Retrieve flag indicating whether instrumentation is enabled
+INSTRUMENTATION_ENABLED = bool(os.environ.get('STORY_WRAPPER_INSTRUMENTATION', False))
+# Prefix for exported Prometheus metric names
+METRIC_PREFIX = 'story_wrapper'
+
+
+def peak_rss_bytes() -> Optional[int]:
+    """Return the peak resident set size of this process in bytes, if available."""
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is in bytes on macOS and kilobytes elsewhere
+    return peak if sys.platform == 'darwin' else peak * 1024
+
+
+class NullStage:
+    """Stage returned when instrumentation is disabled - does nothing."""
+    items = 0
+
+    def __enter__(self) -> "NullStage":
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        return None
+
+    def __setattr__(self, name: str, value: Any) -> None:
+        """Ignore item counts so the shared instance is never modified."""
+
+
+NULL_STAGE = NullStage()
+
+
+class Stage:
+    """Context manager timing a single run of a stage."""
+
+    def __init__(self, instrumentation: "Instrumentation", name: str, items: int = 0):
+        self.instrumentation = instrumentation
+        self.name = name
+        self.items = items
+        self.start = None
+        self.start_rss = None
+
+    def __enter__(self) -> "Stage":
+        self.start_rss = peak_rss_bytes()
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        seconds = time.perf_counter() - self.start
+        end_rss = peak_rss_bytes()
+        rss_growth = end_rss - self.start_rss if end_rss is not None else None
+        self.instrumentation.record(self.name, seconds, self.items, peak_rss=end_rss, rss_growth=rss_growth)
+
+
+class Instrumentation:
+    """Collects aggregate timings for named stages."""
+
+    def __init__(self, enabled: bool = False):
+        """Initialize the collector."""
+        self.enabled = enabled
+        self._lock = threading.Lock()
+        self._stats: Dict[str, Dict[str, Any]] = {}
+        self._enable_hooks: List[Callable[[], None]] = []
+
+    def __getstate__(self) -> Dict[str, Any]:
+        """Drop the lock and hooks so pipelines holding a collector can be sent to worker processes."""
+        state = self.__dict__.copy()
+        del state['_lock']
+        state['_enable_hooks'] = []
+        return state
+
+    def __setstate__(self, state: Dict[str, Any]):
+        self.__dict__.update(state)
+        self._lock = threading.Lock()
+
+    def add_enable_hook(self, hook: Callable[[], None]):
+        """Register a function to call whenever recording is enabled, e.g. to wrap a loaded pipeline."""
+        self._enable_hooks.append(hook)
+
+    def enable(self):
+        """Start recording stages."""
+        self.enabled = True
+        for hook in self._enable_hooks:
+            hook()
+
+    def disable(self):
+        """Stop recording stages, keeping what has been recorded so far."""
+        self.enabled = False
+
+    def reset(self):
+        """Discard all recorded stages."""
+        with self._lock:
+            self._stats = {}
+
+    def stage(self, name: str, items: int = 0):
+        """Return a context manager that records a run of the named stage.
+
+        Set `items` on the returned object to record how many items the run processed.
+        """
+        if not self.enabled:
+            return NULL_STAGE
+        return Stage(self, name, items)
+
+    def record(self, name: str, seconds: float, items: int = 0, peak_rss: Optional[int] = None,
+               rss_growth: Optional[int] = None):
+        """Add a run of the named stage to the aggregates."""
+        with self._lock:
+            stats = self._stats.get(name)
+            if stats is None:
+                stats = self._stats[name] = {
+                    'calls': 0, 'seconds': 0.0, 'max_seconds': 0.0, 'items': 0,
+                    'peak_rss_bytes': None, 'rss_growth_bytes': 0,
+                }
+            stats['calls'] += 1
+            stats['seconds'] += seconds
+            stats['max_seconds'] = max(stats['max_seconds'], seconds)
+            stats['items'] += items
+            if peak_rss is not None:
+                stats['peak_rss_bytes'] = max(stats['peak_rss_bytes'] or 0, peak_rss)
+            if rss_growth is not None:
+                stats['rss_growth_bytes'] += rss_growth
+
+    def stats(self) -> Dict[str, Dict[str, Any]]:
+        """Return a copy of the aggregates for each stage, with derived throughput."""
+        with self._lock:
+            stats = {name: dict(values) for name, values in self._stats.items()}
+        for values in stats.values():
+            values['items_per_second'] = values['items'] / values['seconds'] if values['seconds'] else None
+        return stats
+
+    def to_json(self, **kwargs) -> str:
+        """Export the aggregates as JSON."""
+        return json.dumps(self.stats(), **kwargs)
+
+    def to_prometheus(self, prefix: str = METRIC_PREFIX) -> str:
+        """Export the aggregates in the Prometheus text exposition format."""
+        metrics = [
+            ('stage_calls_total', 'counter', 'Number of runs of the stage.', 'calls'),
+            ('stage_seconds_total', 'counter', 'Total wall time spent in the stage.', 'seconds'),
+            ('stage_max_seconds', 'gauge', 'Longest single run of the stage.', 'max_seconds'),
+            ('stage_items_total', 'counter', 'Number of items processed by the stage.', 'items'),
+            ('stage_peak_rss_bytes', 'gauge', 'Process peak RSS at the end of the stage.', 'peak_rss_bytes'),
+            ('stage_rss_growth_bytes_total', 'counter', 'Growth of process peak RSS during the stage.',
+             'rss_growth_bytes'),
+        ]
+        stats = self.stats()
+        lines = []
+        for metric, metric_type, help_text, key in metrics:
+            name = f"{prefix}_{metric}"
+            lines.append(f"# HELP {name} {help_text}")
+            lines.append(f"# TYPE {name} {metric_type}")
+            for stage, values in sorted(stats.items()):
+                if values[key] is None:
+                    continue
+                label = stage.replace('\\', '\\\\').replace('"', '\\"')
+                lines.append(f'{name}{{stage="{label}"}} {values[key]}')
+        return "\n".join(lines) + "\n"
+
+
+instrumentation = Instrumentation(enabled=INSTRUMENTATION_ENABLED)
+
+
+class TimedComponent:
+    """Wrapper around a spaCy pipeline component (or tokenizer) that times it.
+
+    Attribute access is delegated to the wrapped component, but `nlp.get_pipe`
+    returns the wrapper, so check `.component` for the component's type. Timings
+    recorded in child processes (`n_process > 1`) are not aggregated.
+
+    This class wraps components without a `pipe` method, so that spaCy still calls
+    them one document at a time under its error handler; use `timed_component`
+    to choose the wrapper.
+    """
+
+    def __init__(self, name: str, component, collector: Instrumentation = instrumentation):
+        self.name = name
+        self.stage_name = f"spacy.{name}"
+        self.component = component
+        self.collector = collector
+
+    def __getattr__(self, name: str):
+        # Guard against recursion while unpickling, before component is set
+        if name == 'component':
+            raise AttributeError(name)
+        return getattr(self.component, name)
+
+    def __call__(self, doc, **kwargs):
+        if not self.collector.enabled:
+            return self.component(doc, **kwargs)
+        # Called once per document so skip the memory measurement of a full stage
+        start = time.perf_counter()
+        doc = self.component(doc, **kwargs)
+        self.collector.record(self.stage_name, time.perf_counter() - start, 1)
+        return doc
+
+
+class TimedPipeComponent(TimedComponent):
+    """TimedComponent for components with a `pipe` method.
+
+    When run through `nlp.pipe`, time spent pulling documents from upstream
+    components is excluded.
+    """
+
+    def pipe(self, stream: Iterable, **kwargs) -> Iterator:
+        """Process a stream of documents, recording time spent in this component."""
+        if not self.collector.enabled:
+            return self.component.pipe(stream, **kwargs)
+        return self._timed_pipe(stream, kwargs)
+
+    def _timed_pipe(self, stream: Iterable, kwargs: Dict) -> Iterator:
+        upstream_seconds = 0.0
+
+        def timed_stream():
+            nonlocal upstream_seconds
+            iterator = iter(stream)
+            while True:
+                start = time.perf_counter()
+                try:
+                    doc = next(iterator)
+                except StopIteration:
+                    upstream_seconds += time.perf_counter() - start
+                    return
+                upstream_seconds += time.perf_counter() - start
+                yield doc
+
+        seconds = 0.0
+        count = 0
+        iterator = self.component.pipe(timed_stream(), **kwargs)
+        try:
+            while True:
+                start = time.perf_counter()
+                try:
+                    doc = next(iterator)
+                except StopIteration:
+                    seconds += time.perf_counter() - start
+                    break
+                seconds += time.perf_counter() - start
+                count += 1
+                yield doc
+        finally:
+            self.collector.record(self.stage_name, seconds - upstream_seconds, count)
+
+
+def timed_component(name: str, component, collector: Instrumentation = instrumentation) -> TimedComponent:
+    """Wrap a component in a TimedPipeComponent if it has a `pipe` method, otherwise a TimedComponent."""
+    if hasattr(component, 'pipe'):
+        return TimedPipeComponent(name, component, collector)
+    return TimedComponent(name, component, collector)
+
+
+def instrument_pipeline(nlp, collector: Instrumentation = instrumentation):
+    """Wrap the tokenizer and each component of a spaCy pipeline in a TimedComponent."""
+    if not isinstance(nlp.tokenizer, TimedComponent):
+        nlp.tokenizer = timed_component('tokenizer', nlp.tokenizer, collector)
+    # spaCy has no public API for swapping a component instance in place
+    for i, (name, component) in enumerate(nlp._components):
+        if not isinstance(component, TimedComponent):
+            nlp._components[i] = (name, timed_component(name, component, collector))
+    logging.debug(f"Instrumented spaCy pipeline components: {nlp.pipe_names}")
+    return nlp
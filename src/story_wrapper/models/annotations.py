@@ -0,0 +1,316 @@
+"""Columnar export of processed story annotations.
+
+    AnnotationWriter streams the docs of processed Story objects into chunks of
+    NumPy column files, with every string (token text, lemma, tags, entity labels)
+    stored once in a shared string table. AnnotationReader memory-maps the columns
+    back for analytics, so loading annotations for a large corpus does not require
+    unpickling spaCy docs.
+
+    Layout of an export folder:
+
+        manifest.json                  format, chunk list and row counts per table
+        strings.json                   shared string table, indexed by the string columns
+        chunk_00000/tokens.text.npy    one file per table column ("npy" format), or
+        chunk_00000.npz                one compressed archive per chunk ("npz" format)
+
+    Tables and columns (all row indices are relative to the chunk):
+
+        docs       story_id, doc_index, token_start, token_end, sent_start, sent_end, ent_start, ent_end
+        tokens     text, lemma, pos, tag, dep, ent_type (string ids), head, idx, ent_iob, whitespace
+        sentences  start, end
+        entities   doc, start, end, label, text (string ids for label and text)
+
+    >>> with AnnotationWriter("annotations") as writer:
+    ...     writer.add_story(1342, story)
+    >>> reader = AnnotationReader("annotations")
+    >>> reader.table("entities")["label"]
+
+"""
+from __future__ import annotations
+from typing import TYPE_CHECKING, Dict, Iterable, Iterator, List, Optional
+import json
+import logging
+import os
+import numpy as np
+
+if TYPE_CHECKING:
+    from spacy.tokens import Doc
+    from story_wrapper.models.story import Story
+
+# Number of tokens buffered before a chunk is written
+CHUNK_TOKENS = 1_000_000
+FORMATS = ("npy", "npz")
+MANIFEST_FILE = "manifest.json"
+STRINGS_FILE = "strings.json"
+
+# Column names and dtypes for each table
+COLUMNS = {
+    "docs": {
+        "story_id": np.int64, "doc_index": np.int32, "token_start": np.int64, "token_end": np.int64,
+        "sent_start": np.int64, "sent_end": np.int64, "ent_start": np.int64, "ent_end": np.int64,
+    },
+    "tokens": {
+        "text": np.int32, "lemma": np.int32, "pos": np.int32, "tag": np.int32, "dep": np.int32,
+        "ent_type": np.int32, "head": np.int64, "idx": np.int32, "ent_iob": np.int8, "whitespace": np.bool_,
+    },
+    "sentences": {"start": np.int64, "end": np.int64},
+    "entities": {"doc": np.int64, "start": np.int64, "end": np.int64, "label": np.int32, "text": np.int32},
+}
+# Columns holding row indices into another table, rebased when chunks are concatenated
+REFERENCES = {
+    ("docs", "token_start"): "tokens", ("docs", "token_end"): "tokens",
+    ("docs", "sent_start"): "sentences", ("docs", "sent_end"): "sentences",
+    ("docs", "ent_start"): "entities", ("docs", "ent_end"): "entities",
+    ("tokens", "head"): "tokens",
+    ("sentences", "start"): "tokens", ("sentences", "end"): "tokens",
+    ("entities", "doc"): "docs", ("entities", "start"): "tokens", ("entities", "end"): "tokens",
+}
+
+
+class StringTable:
+    """Assigns a stable integer id to each distinct string."""
+
+    def __init__(self, strings: Optional[List[str]] = None):
+        """Initialize the table, with the empty string as id 0."""
+        self.strings = list(strings) if strings else [""]
+        self.ids = {string: i for i, string in enumerate(self.strings)}
+
+    def __len__(self) -> int:
+        """Return the number of strings in the table."""
+        return len(self.strings)
+
+    def __getitem__(self, string_id: int) -> str:
+        """Return the string with the given id."""
+        return self.strings[string_id]
+
+    def add(self, string: str) -> int:
+        """Return the id of a string, adding it to the table if needed."""
+        string_id = self.ids.get(string)
+        if string_id is None:
+            string_id = self.ids[string] = len(self.strings)
+            self.strings.append(string)
+        return string_id
+
+    def add_hashes(self, hashes: np.ndarray, string_store) -> np.ndarray:
+        """Convert an array of spaCy string hashes to string ids, looking up each distinct hash once."""
+        unique, inverse = np.unique(hashes, return_inverse=True)
+        ids = np.array(
+            [self.add(string_store[int(value)]) if value else 0 for value in unique], dtype=np.int32
+        )
+        return ids[inverse.reshape(-1)]
+
+
+class AnnotationWriter:
+    """Streams processed docs into chunked columnar files."""
+
+    def __init__(self, path: str, chunk_tokens: int = CHUNK_TOKENS, file_format: str = "npy"):
+        """Initialize the writer.
+
+        The "npy" format writes uncompressed column files that can be memory-mapped;
+        "npz" writes a compressed archive per chunk, which is smaller but read eagerly.
+        """
+        if file_format not in FORMATS:
+            raise ValueError(f"Unknown format {file_format}, expected one of {FORMATS}.")
+        if os.path.exists(os.path.join(path, MANIFEST_FILE)):
+            raise FileExistsError(f"An export already exists at {path}.")
+        os.makedirs(path, exist_ok=True)
+        self.path = path
+        self.chunk_tokens = chunk_tokens
+        self.format = file_format
+        self.strings = StringTable()
+        self.chunks = []
+        self._reset_buffer()
+
+    def __enter__(self) -> AnnotationWriter:
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback) -> None:
+        # Without a manifest a partial export is not mistaken for a complete one, and can be rerun
+        if exc_type is not None:
+            logging.warning(f"Export to {self.path} failed - the manifest was not written.")
+            return
+        self.close()
+
+    def _reset_buffer(self):
+        self._buffer = {table: {column: [] for column in columns} for table, columns in COLUMNS.items()}
+        self._counts = {table: 0 for table in COLUMNS}
+
+    def add_story(self, story_id: int, story: Story):
+        """Add the docs of a processed story."""
+        self.add_docs(story_id, story.docs)
+
+    def add_docs(self, story_id: int, docs: Iterable[Doc]):
+        """Add a sequence of docs, such as the paragraphs of a story."""
+        for doc_index, doc in enumerate(docs):
+            self.add_doc(story_id, doc_index, doc)
+
+    def add_doc(self, story_id: int, doc_index: int, doc: Doc):
+        """Add a single doc, writing a chunk if the buffer is full."""
+        from spacy.attrs import DEP, ENT_IOB, ENT_TYPE, HEAD, IDX, LEMMA, ORTH, POS, SPACY, TAG
+        buffer, counts = self._buffer, self._counts
+        token_offset = counts["tokens"]
+        string_store = doc.vocab.strings
+        array = doc.to_array([ORTH, LEMMA, POS, TAG, DEP, ENT_TYPE, HEAD, IDX, ENT_IOB, SPACY])
+        tokens = buffer["tokens"]
+        for column, i in (("text", 0), ("lemma", 1), ("pos", 2), ("tag", 3), ("dep", 4), ("ent_type", 5)):
+            tokens[column].append(self.strings.add_hashes(array[:, i], string_store))
+        # Heads are stored by spaCy relative to the token
+        positions = np.arange(len(doc), dtype=np.int64)
+        tokens["head"].append(array[:, 6].view(np.int64) + positions + token_offset)
+        tokens["idx"].append(array[:, 7])
+        tokens["ent_iob"].append(array[:, 8])
+        tokens["whitespace"].append(array[:, 9])
+        counts["tokens"] += len(doc)
+
+        sent_start = counts["sentences"]
+        if doc.has_annotation("SENT_START"):
+            for sent in doc.sents:
+                buffer["sentences"]["start"].append(token_offset + sent.start)
+                buffer["sentences"]["end"].append(token_offset + sent.end)
+                counts["sentences"] += 1
+
+        ent_start = counts["entities"]
+        for ent in doc.ents:
+            entities = buffer["entities"]
+            entities["doc"].append(counts["docs"])
+            entities["start"].append(token_offset + ent.start)
+            entities["end"].append(token_offset + ent.end)
+            entities["label"].append(self.strings.add(ent.label_))
+            entities["text"].append(self.strings.add(ent.text))
+            counts["entities"] += 1
+
+        docs = buffer["docs"]
+        for column, value in (
+                ("story_id", story_id), ("doc_index", doc_index),
+                ("token_start", token_offset), ("token_end", counts["tokens"]),
+                ("sent_start", sent_start), ("sent_end", counts["sentences"]),
+                ("ent_start", ent_start), ("ent_end", counts["entities"])):
+            docs[column].append(value)
+        counts["docs"] += 1
+
+        if counts["tokens"] >= self.chunk_tokens:
+            self.flush()
+
+    def _column_array(self, table: str, column: str) -> np.ndarray:
+        values = self._buffer[table][column]
+        dtype = COLUMNS[table][column]
+        if table == "tokens":
+            if not values:
+                return np.zeros(0, dtype=dtype)
+            return np.concatenate(values).astype(dtype, copy=False)
+        return np.array(values, dtype=dtype)
+
+    def flush(self):
+        """Write the buffered docs as a chunk."""
+        if not self._counts["docs"]:
+            return
+        name = f"chunk_{len(self.chunks):05d}"
+        arrays = {
+            f"{table}.{column}": self._column_array(table, column)
+            for table, columns in COLUMNS.items() for column in columns
+        }
+        if self.format == "npz":
+            np.savez_compressed(os.path.join(self.path, f"{name}.npz"), **arrays)
+        else:
+            folder = os.path.join(self.path, name)
+            os.makedirs(folder, exist_ok=True)
+            for key, array in arrays.items():
+                np.save(os.path.join(folder, f"{key}.npy"), array)
+        self.chunks.append({"name": name, "rows": dict(self._counts)})
+        logging.debug(f"Wrote annotation chunk {name} with {self._counts['docs']} docs.")
+        self._reset_buffer()
+
+    def close(self):
+        """Write any buffered docs, the string table and the manifest."""
+        self.flush()
+        with open(os.path.join(self.path, STRINGS_FILE), "w") as strings_file:
+            json.dump(self.strings.strings, strings_file)
+        with open(os.path.join(self.path, MANIFEST_FILE), "w") as manifest_file:
+            json.dump({"format": self.format, "columns": {
+                table: list(columns) for table, columns in COLUMNS.items()
+            }, "chunks": self.chunks}, manifest_file, indent=2)
+
+
+class AnnotationReader:
+    """Reads an export written by AnnotationWriter, memory-mapping "npy" columns."""
+
+    def __init__(self, path: str):
+        """Load the manifest and string table."""
+        self.path = path
+        with open(os.path.join(path, MANIFEST_FILE)) as manifest_file:
+            self.manifest = json.load(manifest_file)
+        with open(os.path.join(path, STRINGS_FILE)) as strings_file:
+            self.strings = StringTable(json.load(strings_file))
+        self.format = self.manifest["format"]
+        self.chunks = self.manifest["chunks"]
+        self._archives = {}
+
+    def __len__(self) -> int:
+        """Return the number of docs in the export."""
+        return sum(chunk["rows"]["docs"] for chunk in self.chunks)
+
+    def column(self, chunk: int, table: str, column: str) -> np.ndarray:
+        """Return one column of a chunk, with row indices relative to that chunk."""
+        name = self.chunks[chunk]["name"]
+        key = f"{table}.{column}"
+        if self.format == "npz":
+            if name not in self._archives:
+                self._archives[name] = np.load(os.path.join(self.path, f"{name}.npz"))
+            return self._archives[name][key]
+        return np.load(os.path.join(self.path, name, f"{key}.npy"), mmap_mode="r")
+
+    def iter_chunks(self, table: str) -> Iterator[Dict[str, np.ndarray]]:
+        """Yield the columns of a table one chunk at a time, without copying "npy" columns."""
+        for chunk in range(len(self.chunks)):
+            yield {column: self.column(chunk, table, column) for column in COLUMNS[table]}
+
+    def table(self, table: str, columns: Optional[List[str]] = None) -> Dict[str, np.ndarray]:
+        """Return columns of a table concatenated across chunks, with row indices rebased."""
+        columns = columns or list(COLUMNS[table])
+        result = {}
+        for column in columns:
+            referenced = REFERENCES.get((table, column))
+            parts = []
+            offset = 0
+            for chunk in range(len(self.chunks)):
+                values = self.column(chunk, table, column)
+                parts.append(values + offset if referenced and offset else values)
+                if referenced:
+                    offset += self.chunks[chunk]["rows"][referenced]
+            if len(parts) == 1:
+                # Keep a single chunk memory-mapped
+                result[column] = parts[0]
+            elif parts:
+                result[column] = np.concatenate(parts)
+            else:
+                result[column] = np.zeros(0, dtype=COLUMNS[table][column])
+        return result
+
+    def decode(self, string_ids: np.ndarray) -> List[str]:
+        """Convert an array of string ids to strings."""
+        strings = self.strings.strings
+        return [strings[string_id] for string_id in string_ids.tolist()]
+
+    def entities(self) -> Iterator[Dict]:
+        """Yield each entity with its story id, doc index, label and text."""
+        for chunk in range(len(self.chunks)):
+            story_ids = self.column(chunk, "docs", "story_id")
+            doc_indexes = self.column(chunk, "docs", "doc_index")
+            entities = {column: self.column(chunk, "entities", column) for column in COLUMNS["entities"]}
+            for doc, label, text in zip(
+                    entities["doc"].tolist(), entities["label"].tolist(), entities["text"].tolist()):
+                yield {
+                    "story_id": int(story_ids[doc]),
+                    "doc_index": int(doc_indexes[doc]),
+                    "label": self.strings[label],
+                    "text": self.strings[text],
+                }
+
+
+def export_stories(path: str, stories: Iterable, chunk_tokens: int = CHUNK_TOKENS,
+                   file_format: str = "npy") -> str:
+    """Export (story_id, Story) pairs to path and return the path."""
+    with AnnotationWriter(path, chunk_tokens=chunk_tokens, file_format=file_format) as writer:
+        for story_id, story in stories:
+            writer.add_story(story_id, story)
+    return path
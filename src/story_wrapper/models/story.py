@@ -1,9 +1,14 @@
 """Wrapper for a longer form document built of spaCy docs."""
+from __future__ import annotations
 import re
-from typing import List, Optional, Tuple, Union
+from typing import TYPE_CHECKING, List, Optional, Tuple, Union
 from collections import Counter
 from story_wrapper.config_spacy import nlp_service
-from spacy.tokens import Doc, Span, Token
+from story_wrapper.instrumentation import instrumentation
+
+if TYPE_CHECKING:
+    # spaCy is only imported when the nlp object is first loaded
+    from spacy.tokens import Doc, Span, Token
 
 # Regex for whitespace
 WHITESPACE = re.compile(r" ?(?:\t|\r|\n  +|\u2007+|\u2003+|\ue89e+|\u2062+|\ue8a0+) ?")
@@ -28,7 +33,9 @@ class Story:
         # Convert to default list even if single string
         if isinstance(text, str):
             self.text = [text]
-        self.text = [clean_text(t) for t in text]
+        with instrumentation.stage('story.clean_text') as stage:
+            self.text = [clean_text(t) for t in text]
+            stage.items = len(self.text)
         if process_on_load:
             self.docs = self.process()
         else:
@@ -61,10 +68,12 @@ class Story:
     def process(self) -> List[Doc]:
         """Process the story and return a list of spacy docs."""
         nlp = nlp_service.get_nlp()
-        doc_generator = nlp.pipe(
-            self.text
-        )
-        return list(doc_generator)
+        with instrumentation.stage('story.process', items=len(self.text)):
+            doc_generator = nlp.pipe(
+                self.text,
+                **nlp_service.get_pipe_settings()
+            )
+            return list(doc_generator)
 
     def unique_entities(self) -> Tuple[set, List[Span]]:
         """Return a list of unique entities in the story."""
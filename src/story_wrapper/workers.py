@@ -0,0 +1,234 @@
+"""Pre-fork worker pool sharing one loaded spaCy model copy-on-write.
+
+    The model is loaded once in the parent process and the workers are forked
+    from it, so the weights and vocabulary pages are shared between processes
+    until one of them writes to a page. To keep them shared:
+
+    - The model is warmed up before forking, so lazy initialisation happens
+      once in the parent rather than in every worker.
+    - `gc.freeze()` moves every object alive at fork time into a permanent
+      generation, so garbage collection passes never write to their headers.
+    - Weights live in the data buffers of torch tensors (transformer models
+      such as en_core_web_trf) or NumPy arrays (thinc models such as
+      en_core_web_sm), separate from the Python objects whose reference counts
+      change, so reading them does not dirty pages.
+
+    Each worker is limited to `threads_per_worker` torch threads, so N workers
+    do not each start a thread per core.
+
+    `memory_usage` reports the unique (USS) and proportional (PSS) memory of a
+    process, which shows how much of each worker is actually shared.
+
+    >>> with PreforkPool(n_workers=4) as pool:
+    ...     stories = pool.process_stories([book.paragraphs for book in books])
+    ...     print(pool.memory_report())
+
+"""
+from typing import Any, Callable, Dict, Iterable, List, Optional
+import gc
+import logging
+import multiprocessing as mp
+import os
+import queue
+import traceback
+from story_wrapper import config_spacy
+from story_wrapper.autotune import load_settings, model_key, set_num_threads
+from story_wrapper.config_spacy import nlp_service
+from story_wrapper.models.story import Story
+
+# Fields of /proc/<pid>/smaps_rollup used for the memory report, in kB
+SMAPS_FIELDS = {
+    'Rss': 'rss', 'Pss': 'pss', 'Shared_Clean': 'shared_clean', 'Shared_Dirty': 'shared_dirty',
+    'Private_Clean': 'private_clean', 'Private_Dirty': 'private_dirty',
+}
+WARMUP_TEXT = "This text warms up the pipeline before the workers are forked."
+
+# The pool's model, set in each worker process when it starts
+_worker_nlp = None
+
+
+def memory_usage(pid: Optional[int] = None) -> Dict[str, int]:
+    """Return the memory of a process in bytes, read from /proc (Linux only).
+
+    `uss` is the memory unique to the process - what would be freed if it exited.
+    `pss` counts shared pages divided by the number of processes sharing them.
+    """
+    pid = pid or os.getpid()
+    path = f"/proc/{pid}/smaps_rollup"
+    if not os.path.exists(path):
+        # Older kernels - sum the per-mapping figures instead
+        path = f"/proc/{pid}/smaps"
+    usage = {name: 0 for name in SMAPS_FIELDS.values()}
+    with open(path) as smaps:
+        for line in smaps:
+            field, _, value = line.partition(':')
+            if field in SMAPS_FIELDS:
+                usage[SMAPS_FIELDS[field]] += int(value.split()[0]) * 1024
+    usage['shared'] = usage['shared_clean'] + usage['shared_dirty']
+    usage['uss'] = usage['private_clean'] + usage['private_dirty']
+    return usage
+
+
+def get_worker_nlp():
+    """Get the model of the pool this worker belongs to, or the `nlp_service` model outside a worker."""
+    if _worker_nlp is None:
+        return nlp_service.get_nlp()
+    return _worker_nlp
+
+
+def pipe_to_bytes(texts: List[str], pipe_settings: Dict) -> bytes:
+    """Process texts with the model in this worker and serialise the docs."""
+    from spacy.tokens import DocBin
+    nlp = get_worker_nlp()
+    doc_bin = DocBin()
+    for doc in nlp.pipe(texts, **pipe_settings):
+        doc_bin.add(doc)
+    return doc_bin.to_bytes()
+
+
+def worker_loop(tasks, results, nlp, n_threads: Optional[int] = None):
+    """Run tasks from the queue until a None task is received.
+
+    nlp is inherited from the parent when the worker is forked, not pickled.
+    """
+    global _worker_nlp
+    _worker_nlp = nlp
+    set_num_threads(n_threads)
+    while True:
+        task = tasks.get()
+        if task is None:
+            break
+        task_id, func, args = task
+        try:
+            results.put((task_id, True, func(*args)))
+        except Exception:
+            results.put((task_id, False, traceback.format_exc()))
+
+
+def drain(task_queue) -> int:
+    """Remove everything currently in a queue and return the number of items removed."""
+    removed = 0
+    while True:
+        try:
+            task_queue.get_nowait()
+        except queue.Empty:
+            return removed
+        removed += 1
+
+
+class PreforkPool:
+    """Pool of worker processes forked after the spaCy model has been loaded."""
+
+    def __init__(self, n_workers: Optional[int] = None, nlp=None, freeze: bool = True,
+                 threads_per_worker: Optional[int] = 1):
+        """Load and warm up the model, then fork the workers.
+
+        Each worker uses threads_per_worker torch threads, or the parent's thread count if None.
+        Pass nlp to share an already loaded pipeline instead of the one from `nlp_service`,
+        which is left unchanged. With freeze, objects in the parent are exempt from garbage
+        collection until the pool is closed.
+        """
+        if config_spacy.GPU_ENABLED:
+            raise RuntimeError("Workers cannot be forked once CUDA is initialised - use one process per GPU.")
+        if 'fork' not in mp.get_all_start_methods():
+            raise RuntimeError("Pre-fork workers need the fork start method, which is not available here.")
+        # Settings are resolved in the parent so workers do not each read them
+        if nlp is None:
+            self.nlp = nlp_service.get_nlp()
+            settings = nlp_service.get_pipe_settings()
+        else:
+            self.nlp = nlp
+            settings = load_settings(model_key(nlp)) or {}
+        # Each worker is a single process
+        self.pipe_settings = {key: settings[key] for key in ('batch_size',) if key in settings}
+        list(self.nlp.pipe([WARMUP_TEXT]))
+        self.freeze = freeze
+        if freeze:
+            gc.collect()
+            gc.freeze()
+        context = mp.get_context('fork')
+        self.tasks = context.Queue()
+        self.results = context.Queue()
+        self.workers = [
+            context.Process(target=worker_loop, args=(self.tasks, self.results, self.nlp, threads_per_worker),
+                            daemon=True)
+            for _ in range(n_workers or os.cpu_count() or 1)
+        ]
+        for worker in self.workers:
+            worker.start()
+        self._next_task_id = 0
+        logging.info(f"Forked {len(self.workers)} workers sharing the model.")
+
+    def __enter__(self) -> "PreforkPool":
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.close()
+
+    def map(self, func: Callable, args_list: Iterable[tuple]) -> List[Any]:
+        """Run func(*args) in the workers for each args tuple and return the results in order.
+
+        func must be a module level function so it can be sent to the workers.
+        """
+        task_ids = []
+        for args in args_list:
+            self.tasks.put((self._next_task_id, func, tuple(args)))
+            task_ids.append(self._next_task_id)
+            self._next_task_id += 1
+        results = {}
+        errors = []
+        for _ in task_ids:
+            task_id, ok, result = self.get_result()
+            if ok:
+                results[task_id] = result
+            else:
+                errors.append(result)
+        if errors:
+            raise RuntimeError(f"{len(errors)} worker tasks failed. First error:\n{errors[0]}")
+        return [results[task_id] for task_id in task_ids]
+
+    def get_result(self, poll_seconds: float = 1.0):
+        """Wait for the next result, failing if a worker has died rather than waiting forever."""
+        while True:
+            try:
+                return self.results.get(timeout=poll_seconds)
+            except queue.Empty:
+                dead = [worker.pid for worker in self.workers if not worker.is_alive()]
+                if dead:
+                    raise RuntimeError(f"Worker processes {dead} exited unexpectedly.")
+
+    def pipe(self, batches: Iterable[List[str]]) -> List[List]:
+        """Process each batch of texts in a worker and return the docs for each batch."""
+        from spacy.tokens import DocBin
+        payloads = self.map(pipe_to_bytes, ((batch, self.pipe_settings) for batch in batches))
+        return [list(DocBin().from_bytes(payload).get_docs(self.nlp.vocab)) for payload in payloads]
+
+    def process_stories(self, texts: Iterable[List[str]]) -> List[Story]:
+        """Build a processed Story from each list of paragraphs, one story per task."""
+        stories = [Story(text, process_on_load=False) for text in texts]
+        for story, docs in zip(stories, self.pipe(story.text for story in stories)):
+            story.docs = docs
+        return stories
+
+    def memory_report(self) -> Dict[str, Dict[str, int]]:
+        """Return the memory usage of the parent and each live worker, keyed by role and pid."""
+        report = {f"parent:{os.getpid()}": memory_usage()}
+        for worker in self.workers:
+            if worker.is_alive():
+                report[f"worker:{worker.pid}"] = memory_usage(worker.pid)
+        return report
+
+    def close(self):
+        """Stop the workers, discarding any tasks and results left over from a failed map."""
+        drain(self.tasks)
+        for _ in self.workers:
+            self.tasks.put(None)
+        for worker in self.workers:
+            # Keep reading results so that no worker blocks writing to a full queue
+            while worker.is_alive():
+                drain(self.results)
+                worker.join(timeout=0.1)
+        drain(self.results)
+        self.workers = []
+        if self.freeze:
+            gc.unfreeze()
@@ -0,0 +1,92 @@
+"""Code to test the columnar export of story annotations."""
+import os
+import tempfile
+from unittest import TestCase
+import numpy as np
+import spacy
+from spacy.tokens import Span
+from story_wrapper.models.story import Story
+from story_wrapper.models.annotations import AnnotationReader, AnnotationWriter, export_stories
+from tests.test_book import Book, TEST_BOOK_TEXT
+
+
+def make_story(paragraphs):
+    """Process paragraphs with a blank pipeline, tagging capitalised words after the first as PERSON."""
+    nlp = spacy.blank('en')
+    nlp.add_pipe('sentencizer')
+    story = Story(paragraphs, process_on_load=False)
+    story.docs = list(nlp.pipe(story.text))
+    for doc in story.docs:
+        doc.ents = [Span(doc, token.i, token.i + 1, label='PERSON')
+                    for token in doc[1:] if token.text.istitle() and not doc[token.i - 1].is_punct]
+    return story
+
+
+class TestAnnotations(TestCase):
+    def setUp(self) -> None:
+        """Set up test."""
+        self.test_dir = tempfile.TemporaryDirectory()
+        self.stories = [
+            (1, make_story(Book(1, TEST_BOOK_TEXT[0:40000]).paragraphs)),
+            (2, make_story(["Mary met John at the station. They talked.", "Then John left."])),
+        ]
+
+    def check_export(self, path):
+        """The export round trips docs, tokens, sentences and entities."""
+        reader = AnnotationReader(path)
+        docs = [doc for _, story in self.stories for doc in story.docs]
+        assert len(reader) == len(docs)
+        doc_table = reader.table('docs')
+        assert doc_table['story_id'].tolist() == [story_id for story_id, story in self.stories for _ in story.docs]
+        tokens = reader.table('tokens')
+        assert reader.decode(tokens['text']) == [token.text for doc in docs for token in doc]
+        last = docs[-3]
+        start, end = doc_table['token_start'][-3], doc_table['token_end'][-3]
+        assert reader.decode(tokens['text'][start:end]) == [token.text for token in last]
+        assert (tokens['head'][start:end] - start).tolist() == [token.head.i for token in last]
+        sentences = reader.table('sentences')
+        assert len(sentences['start']) == sum(len(list(doc.sents)) for doc in docs)
+        entities = list(reader.entities())
+        assert entities == [
+            {'story_id': story_id, 'doc_index': doc_index, 'label': ent.label_, 'text': ent.text}
+            for story_id, story in self.stories for doc_index, doc in enumerate(story.docs) for ent in doc.ents
+        ]
+        assert entities[-1] == {'story_id': 2, 'doc_index': 1, 'label': 'PERSON', 'text': 'John'}
+        entity_table = reader.table('entities')
+        assert reader.decode(tokens['text'][entity_table['start']]) == [entity['text'] for entity in entities]
+        return reader
+
+    def test_npy(self):
+        """Small chunks of uncompressed columns are memory-mapped."""
+        path = export_stories(os.path.join(self.test_dir.name, 'npy'), self.stories, chunk_tokens=200)
+        reader = self.check_export(path)
+        assert len(reader.chunks) > 1
+        assert isinstance(reader.column(0, 'tokens', 'text'), np.memmap)
+
+    def test_npz(self):
+        """Compressed chunks are read back."""
+        path = os.path.join(self.test_dir.name, 'npz')
+        with AnnotationWriter(path, file_format='npz') as writer:
+            for story_id, story in self.stories:
+                writer.add_story(story_id, story)
+        reader = self.check_export(path)
+        assert len(reader.chunks) == 1
+        with self.assertRaises(FileExistsError):
+            AnnotationWriter(path)
+
+    def test_failed_export(self):
+        """An export that raises is not marked complete and can be rerun."""
+        path = os.path.join(self.test_dir.name, 'failed')
+
+        def stories():
+            yield self.stories[0]
+            raise RuntimeError("processing failed")
+
+        with self.assertRaises(RuntimeError):
+            export_stories(path, stories(), chunk_tokens=200)
+        assert not os.path.exists(os.path.join(path, 'manifest.json'))
+        self.check_export(export_stories(path, self.stories, chunk_tokens=200))
+
+    def tearDown(self):
+        """Remove the export directory."""
+        self.test_dir.cleanup()
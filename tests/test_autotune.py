@@ -0,0 +1,85 @@
+"""Code to test the pipe settings autotuner."""
+import os
+import tempfile
+from unittest import TestCase
+from unittest.mock import patch
+import spacy
+from story_wrapper import autotune
+from story_wrapper.config_spacy import NLPService
+from story_wrapper.models.story import Story
+from tests.test_book import Book, TEST_BOOK_TEXT
+
+
+class TestAutotune(TestCase):
+    def setUp(self) -> None:
+        """Set up test."""
+        self.test_dir = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.test_dir.name, 'autotune.json')
+        self.nlp = spacy.blank('en')
+        self.nlp.add_pipe('sentencizer')
+        self.paragraphs = autotune.sample_paragraphs([Book(1, TEST_BOOK_TEXT)], sample_size=50)
+
+    def test_autotune(self):
+        """The fastest settings are saved per model and host."""
+        settings = autotune.autotune(self.nlp, self.paragraphs, batch_sizes=[4, 32], n_process=[1], path=self.path)
+        assert len(self.paragraphs) == 50
+        assert len(settings['trials']) == 2
+        assert settings['batch_size'] in (4, 32)
+        assert settings['paragraphs_per_second'] == max(trial['paragraphs_per_second'] for trial in settings['trials'])
+        assert settings['model'] == 'en_pipeline'
+        assert autotune.load_settings('en_pipeline', path=self.path)['batch_size'] == settings['batch_size']
+        assert autotune.load_settings('en_core_web_sm', path=self.path) is None
+
+    def test_memory_limit(self):
+        """Settings over the memory limit are rejected."""
+        with self.assertRaises(ValueError):
+            autotune.autotune(self.nlp, self.paragraphs, batch_sizes=[4], n_process=[1], max_rss_bytes=1, save=False)
+
+    def test_nlp_service(self):
+        """NLPService and Story pick up the saved settings."""
+        autotune.save_settings('en_pipeline', {'batch_size': 7, 'n_process': 1, 'n_threads': None}, path=self.path)
+        service = NLPService()
+        service.nlp = self.nlp
+        with patch.object(autotune, 'AUTOTUNE_PATH', self.path):
+            assert service.get_pipe_settings() == {'batch_size': 7, 'n_process': 1}
+        with patch('story_wrapper.models.story.nlp_service', service), \
+                patch.object(self.nlp, 'pipe', wraps=self.nlp.pipe) as mock_pipe:
+            story = Story(self.paragraphs[:3])
+        mock_pipe.assert_called_once_with(story.text, batch_size=7, n_process=1)
+        assert len(story.docs) == 3
+
+    def test_corrupt_settings(self):
+        """An unreadable settings file is ignored rather than breaking model loading."""
+        with open(self.path, 'w') as settings_file:
+            settings_file.write('{"en_pipeline@host": {')
+        assert autotune.load_all_settings(self.path) == {}
+        autotune.save_settings('en_pipeline', {'batch_size': 7}, path=self.path)
+        assert autotune.load_settings('en_pipeline', path=self.path) == {'batch_size': 7}
+
+    def test_threads_restored(self):
+        """The torch thread count in place before tuning is restored afterwards."""
+        with patch.object(autotune, 'get_num_threads', return_value=8), \
+                patch.object(autotune, 'set_num_threads') as mock_set_num_threads:
+            autotune.autotune(
+                self.nlp, self.paragraphs, batch_sizes=[4], n_process=[1], n_threads=[1, None, 2], save=False
+            )
+        # The default (None) trial runs with the thread count from before tuning
+        assert [call.args[0] for call in mock_set_num_threads.call_args_list] == [1, 8, 2, 8]
+
+    def test_settings_per_model(self):
+        """Settings follow the current model, and threads are only set when a model is loaded."""
+        autotune.save_settings('en_pipeline', {'batch_size': 7, 'n_process': 1, 'n_threads': 3}, path=self.path)
+        service = NLPService()
+        with patch.object(autotune, 'AUTOTUNE_PATH', self.path), \
+                patch('story_wrapper.config_spacy.load_model', return_value=self.nlp), \
+                patch.object(autotune, 'set_num_threads') as mock_set_num_threads:
+            assert service.get_pipe_settings() == {'batch_size': 7, 'n_process': 1}
+            service.get_pipe_settings()
+            mock_set_num_threads.assert_called_once_with(3)
+            service.nlp = spacy.blank('fr')
+            assert service.get_pipe_settings() == {}
+            mock_set_num_threads.assert_called_once_with(3)
+
+    def tearDown(self):
+        """Remove the settings directory."""
+        self.test_dir.cleanup()
@@ -29,4 +29,14 @@ class TestBook(TestCase):
         ]
         assert len(book.paragraphs) == 305
 
-
+    def test_segmentation(self):
+        """A book rebuilt from its segmentation matches the original."""
+        book = Book(1, TEST_BOOK_TEXT)
+        segmentation = book.get_segmentation()
+        with patch.object(Book, 'get_headings') as mock_get_headings:
+            rebuilt = Book(1, TEST_BOOK_TEXT, segmentation=segmentation)
+        mock_get_headings.assert_not_called()
+        assert rebuilt.heading_locations == book.heading_locations
+        assert rebuilt.end_line == book.end_line
+        assert rebuilt.chapters == book.chapters
+        assert rebuilt.paragraphs == book.paragraphs
@@ -0,0 +1,61 @@
+"""Code to test the book and segmentation caches."""
+import os
+import tempfile
+from unittest import TestCase
+from story_wrapper.data_loaders.book import Book
+from story_wrapper.data_loaders.cache import BookCache, SegmentationCache, book_size
+from tests.test_book import TEST_BOOK_TEXT
+
+
+class TestBookCache(TestCase):
+    def setUp(self) -> None:
+        """Set up test."""
+        self.books = [Book(book_id, TEST_BOOK_TEXT[:40000]) for book_id in range(3)]
+        self.cache = BookCache(max_bytes=2 * book_size(self.books[0]))
+
+    def test_lru(self):
+        """The least recently used book is evicted when the cache is full."""
+        self.cache.put(self.books[0])
+        self.cache.put(self.books[1])
+        assert self.cache.get(0) is self.books[0]
+        self.cache.put(self.books[2])
+        assert 1 not in self.cache
+        assert self.cache.get(1) is None
+        assert self.cache.get(2) is self.books[2]
+        assert self.cache.stats() == {
+            'entries': 2, 'size_bytes': 2 * book_size(self.books[0]), 'max_bytes': self.cache.max_bytes,
+            'hits': 2, 'misses': 1, 'evictions': 1,
+        }
+
+    def test_book_size(self):
+        """The size counts the lines and paragraphs as well as the contents."""
+        assert book_size(self.books[0]) > 2 * len(self.books[0].contents)
+        self.cache.put(self.books[0])
+        self.cache.put(self.books[0])
+        assert self.cache.size_bytes == book_size(self.books[0])
+
+    def test_too_large(self):
+        """Books larger than the cache are not cached."""
+        cache = BookCache(max_bytes=10)
+        cache.put(self.books[0])
+        assert len(cache) == 0
+
+
+class TestSegmentationCache(TestCase):
+    def setUp(self) -> None:
+        """Set up test."""
+        self.test_dir = tempfile.TemporaryDirectory()
+        self.cache = SegmentationCache(os.path.join(self.test_dir.name, 'segmentation'))
+        self.segmentation = Book(1, TEST_BOOK_TEXT).get_segmentation()
+
+    def test_get_put(self):
+        """Segmentations are returned only for the same file modification time."""
+        assert self.cache.get(1, 100.0) is None
+        self.cache.put(1, 100.0, self.segmentation)
+        assert self.cache.get(1, 100.0) == self.segmentation
+        assert self.cache.get(1, 200.0) is None
+        assert self.cache.stats() == {'hits': 1, 'misses': 2, 'stale': 1, 'writes': 1}
+
+    def tearDown(self):
+        """Remove the cache directory."""
+        self.test_dir.cleanup()
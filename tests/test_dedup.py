@@ -0,0 +1,100 @@
+"""Code to test near-duplicate book detection."""
+import os
+import tempfile
+from unittest import TestCase
+from unittest.mock import patch
+from story_wrapper.data_loaders.book import Book
+from story_wrapper.data_loaders.dedup import (
+    SignatureIndex, is_empty_signature, jaccard, minhash_signature, shingles
+)
+from tests.test_book import TEST_BOOK_TEXT
+
+
+class TestDedup(TestCase):
+    def setUp(self) -> None:
+        """Set up test."""
+        self.paragraphs = Book(1, TEST_BOOK_TEXT).paragraphs
+        self.signature = minhash_signature(self.paragraphs)
+
+    def test_shingles(self):
+        """Shingles are lower-cased word windows."""
+        assert shingles(["The cat sat on the mat"], size=3) == {"the cat sat", "cat sat on", "sat on the", "on the mat"}
+        assert shingles(["Two words"], size=3) == {"two words"}
+        assert shingles([]) == set()
+
+    def test_signature(self):
+        """Identical texts match exactly, edited texts closely, and different texts barely."""
+        assert len(self.signature) == 128
+        assert minhash_signature(self.paragraphs) == self.signature
+        edited = self.paragraphs[:-10] + ["A new closing paragraph for this edition."]
+        assert jaccard(self.signature, minhash_signature(edited)) > 0.9
+        other = minhash_signature(self.paragraphs[:len(self.paragraphs) // 4])
+        assert jaccard(self.signature, other) < 0.5
+
+    def test_sparse_signatures(self):
+        """Short texts, whose signatures are mostly densified, match only as much as they overlap."""
+        first = ["It was a dark and stormy night. The lighthouse keeper counted ships through the winter."]
+        second = ["It was a dark and stormy night. A baker in the market sold bread to soldiers every morning."]
+        assert jaccard(minhash_signature(first), minhash_signature(first)) == 1.0
+        # 3 of 19 shingles are shared
+        assert jaccard(minhash_signature(first), minhash_signature(second)) < 0.3
+
+    def test_groups(self):
+        """Duplicates are grouped and unrelated books are left out."""
+        index = SignatureIndex()
+        index.add(1, self.signature)
+        index.add(5, minhash_signature(self.paragraphs[1:]))
+        index.add(7, minhash_signature(self.paragraphs[:30]))
+        assert index.duplicates(1) == [5]
+        assert index.groups() == [[1, 5]]
+        index.remove(5)
+        assert index.groups() == []
+
+    def test_empty_signature(self):
+        """Signatures of books without paragraphs are empty and cannot be indexed."""
+        signature = minhash_signature([])
+        assert is_empty_signature(signature)
+        assert not is_empty_signature(self.signature)
+        index = SignatureIndex()
+        with self.assertRaises(ValueError):
+            index.add(1, signature)
+        assert len(index) == 0
+
+    def test_groups_cached(self):
+        """Groups are computed once and recomputed after the index changes."""
+        index = SignatureIndex()
+        index.add(1, self.signature)
+        index.add(5, minhash_signature(self.paragraphs[1:]))
+        assert index.groups() == [[1, 5]]
+        index.groups()[0].append(99)
+        assert index.groups() == [[1, 5]]
+        version = index.version
+        index.add(9, self.signature)
+        assert index.version > version
+        assert index.groups() == [[1, 5, 9]]
+
+    def test_save_load(self):
+        """The index can be persisted and reloaded."""
+        index = SignatureIndex()
+        index.add(1, self.signature)
+        index.add(5, minhash_signature(self.paragraphs[1:]))
+        with tempfile.TemporaryDirectory() as test_dir:
+            path = os.path.join(test_dir, 'signature_index.gz')
+            index.save(path)
+            loaded = SignatureIndex.load(path)
+        assert loaded.signatures == index.signatures
+        assert loaded.groups() == [[1, 5]]
+
+    def test_load_old_version(self):
+        """Signatures saved by a different version of the algorithm are discarded."""
+        index = SignatureIndex()
+        index.add(1, self.signature)
+        index.empty.add(2)
+        with tempfile.TemporaryDirectory() as test_dir:
+            path = os.path.join(test_dir, 'signature_index.gz')
+            index.save(path)
+            assert SignatureIndex.load(path).is_indexed(2)
+            with patch('story_wrapper.data_loaders.dedup.SIGNATURE_VERSION', -1):
+                loaded = SignatureIndex.load(path)
+        assert len(loaded) == 0
+        assert not loaded.is_indexed(2)
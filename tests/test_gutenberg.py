@@ -2,6 +2,7 @@ import os
 from unittest import TestCase
 from unittest.mock import patch
 import tempfile
+import zipfile
 from story_wrapper.data_loaders.gutenberg import Gutenberg, Book
 from tests.test_book import TEST_BOOK_TEXT
 
@@ -35,10 +36,14 @@ TEST_MD = {
 
 class TestGutenberg(TestCase):
 
-    @patch('story_wrapper.data_loaders.gutenberg.readmetadata', return_value=TEST_MD)
-    @patch.object(Gutenberg, 'parse_file_paths', return_value=[('test_path', "1")])
-    def setUp(self, mock_readmetadata, mock_parse_file_paths) -> None:
+    def setUp(self) -> None:
         """Set up test."""
+        # Indexes are loaded lazily so keep the mocks in place for the whole test
+        self.mock_readmetadata = patch(
+            'story_wrapper.data_loaders.gutenberg.readmetadata', return_value=TEST_MD
+        ).start()
+        patch.object(Gutenberg, 'parse_file_paths', return_value=[('test_path', "1")]).start()
+        self.addCleanup(patch.stopall)
         self.test_dir = tempfile.TemporaryDirectory()
         os.mkdir(os.path.join(self.test_dir.name, 'indexes'))
         self.gutenberg = Gutenberg(index_path=self.test_dir.name)
@@ -52,12 +57,103 @@ class TestGutenberg(TestCase):
         assert self.gutenberg.fiction_md[1]['path'] == 'test_path'
         assert self.gutenberg.get_ids() == [1]
 
+    def test_lazy_init(self):
+        """Indexes are only loaded when first used, and the saved fiction index is reused."""
+        self.mock_readmetadata.assert_not_called()
+        assert self.gutenberg.get_ids() == [1]
+        self.mock_readmetadata.assert_called_once()
+        gutenberg = Gutenberg(index_path=self.test_dir.name)
+        assert gutenberg.get_ids() == [1]
+        self.mock_readmetadata.assert_called_once()
+
     @patch.object(Gutenberg, 'get_book_text', return_value=TEST_BOOK_TEXT)
     def test_get_book(self, mock_get_book_text):
         """Get a book."""
         book = self.gutenberg.get_book_object(1)
         assert isinstance(book, Book)
         assert "The Irish at the Front" in book.contents
+        # Signatures are computed by build_signature_index, not on every load
+        assert 1 not in self.gutenberg.signature_index
+
+    def test_book_caches(self):
+        """Books are cached in memory and their segmentation on disk."""
+        path = os.path.join(self.test_dir.name, '1.zip')
+        with zipfile.ZipFile(path, 'w') as book_zip:
+            book_zip.writestr('1.txt', TEST_BOOK_TEXT)
+        self.gutenberg.fiction_md[1]['path'] = path
+        book = self.gutenberg.get_book_object(1)
+        assert self.gutenberg.get_book_object(1) is book
+        assert self.gutenberg.cache_stats()['books']['hits'] == 1
+        assert self.gutenberg.cache_stats()['segmentation'] == {'hits': 0, 'misses': 1, 'stale': 0, 'writes': 1}
+        # A new instance rebuilds the book from the cached segmentation
+        gutenberg = Gutenberg(index_path=self.test_dir.name)
+        gutenberg.fiction_md[1]['path'] = path
+        with patch.object(Book, 'get_headings') as mock_get_headings:
+            rebuilt = gutenberg.get_book_object(1)
+        mock_get_headings.assert_not_called()
+        assert rebuilt.paragraphs == book.paragraphs
+        assert gutenberg.cache_stats()['segmentation']['hits'] == 1
+
+    @patch.object(Gutenberg, 'get_book_text', return_value=TEST_BOOK_TEXT)
+    def test_sample_books(self, mock_get_book_text):
+        """Sampled books are loaded lazily."""
+        assert self.gutenberg.sample_ids(3, seed=0) == [1, 1, 1]
+        books = self.gutenberg.sample_books(2, seed=0)
+        mock_get_book_text.assert_not_called()
+        assert [book.book_id for book in books] == [1, 1]
+        assert self.gutenberg.stratified_sample_ids(1, key='subject') == {
+            '20th century': [1], 'Fiction': [1], 'History': [1], 'Irish': [1]
+        }
+
+    def test_sampler_updates(self):
+        """The sampler follows books added to the index and edits after a reset."""
+        assert self.gutenberg.sample_ids(5, seed=0) == [1] * 5
+        self.gutenberg.fiction_md[3] = dict(TEST_MD[1], id='3', downloads=1000)
+        assert self.gutenberg.sample_ids(20, seed=0).count(3) > 15
+        self.gutenberg.fiction_md[3]['downloads'] = 0
+        self.gutenberg.fiction_md[1]['downloads'] = 1000
+        self.gutenberg.reset_sampler()
+        assert self.gutenberg.sample_ids(20, seed=0).count(1) > 15
+
+    @patch.object(Gutenberg, 'get_book_text', return_value=TEST_BOOK_TEXT)
+    def test_duplicates(self, mock_get_book_text):
+        """Books with the same text are grouped under a canonical id."""
+        self.gutenberg.fiction_md[3] = dict(TEST_MD[1], id='3', downloads=10)
+        self.gutenberg.build_signature_index()
+        assert os.path.exists(self.gutenberg.signature_index_path)
+        assert self.gutenberg.get_duplicate_groups() == [[3, 1]]
+        assert self.gutenberg.get_canonical_id(1) == 3
+        assert self.gutenberg.get_canonical_ids() == {1: 3, 3: 3}
+
+    def test_duplicates_without_paragraphs(self):
+        """Different books without chapter headings are not grouped as duplicates."""
+        texts = {
+            1: "Once upon a time there was a fox.\n\nThe fox ran into the woods and was never seen again.\n",
+            3: "A play in one act.\n\nHAMLET. To be or not to be, that is the question.\n",
+        }
+        self.gutenberg.fiction_md[3] = dict(TEST_MD[1], id='3')
+        with patch.object(Gutenberg, 'get_book_text', side_effect=texts.get) as mock_get_book_text:
+            self.gutenberg.build_signature_index(save=False)
+            self.gutenberg.book_cache.clear()
+            self.gutenberg.build_signature_index(save=False)
+        # Books without paragraphs are recorded and not loaded again
+        assert mock_get_book_text.call_count == 2
+        assert self.gutenberg.signature_index.empty == {1, 3}
+        assert len(self.gutenberg.signature_index) == 0
+        assert self.gutenberg.get_duplicate_groups() == []
+        assert self.gutenberg.get_canonical_id(1) == 1
+
+    @patch.object(Gutenberg, 'get_book_text', return_value=TEST_BOOK_TEXT)
+    def test_canonical_ids_cached(self, mock_get_book_text):
+        """The canonical mapping is computed once and recomputed when the index changes."""
+        self.gutenberg.fiction_md[3] = dict(TEST_MD[1], id='3', downloads=10)
+        self.gutenberg.build_signature_index(save=False)
+        with patch.object(Gutenberg, 'get_duplicate_groups', wraps=self.gutenberg.get_duplicate_groups) as groups:
+            assert [self.gutenberg.get_canonical_id(book_id) for book_id in (1, 3, 4)] == [3, 3, 4]
+            assert groups.call_count == 1
+            self.gutenberg.signature_index.remove(1)
+            assert self.gutenberg.get_canonical_id(1) == 1
+            assert groups.call_count == 2
 
     def tearDown(self):
         """Close the file, the directory will be removed after the test."""
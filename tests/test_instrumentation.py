@@ -0,0 +1,105 @@
+"""Code to test stage and pipeline component instrumentation."""
+import json
+import pickle
+from unittest import TestCase
+from unittest.mock import patch
+import spacy
+from spacy.language import Language
+from story_wrapper.instrumentation import Instrumentation, NULL_STAGE, TimedComponent, instrument_pipeline
+from tests.test_book import Book, TEST_BOOK_TEXT
+
+
+class TestInstrumentation(TestCase):
+    def setUp(self) -> None:
+        """Set up test."""
+        self.collector = Instrumentation(enabled=True)
+
+    def test_disabled(self):
+        """Nothing is recorded when instrumentation is disabled."""
+        self.collector.disable()
+        with self.collector.stage('disabled') as stage:
+            stage.items = 3
+        assert stage is NULL_STAGE
+        assert NULL_STAGE.items == 0
+        assert self.collector.stats() == {}
+
+    def test_stage(self):
+        """Stages aggregate calls, time and items."""
+        for items in (2, 3):
+            with self.collector.stage('read') as stage:
+                stage.items = items
+        stats = self.collector.stats()['read']
+        assert stats['calls'] == 2
+        assert stats['items'] == 5
+        assert stats['seconds'] >= stats['max_seconds'] > 0
+        assert stats['peak_rss_bytes'] > 0
+        assert json.loads(self.collector.to_json())['read']['items'] == 5
+        self.collector.reset()
+        assert self.collector.stats() == {}
+
+    def test_prometheus(self):
+        """Aggregates are exported in the Prometheus text format."""
+        self.collector.record('book.segmentation', 0.5, items=10)
+        text = self.collector.to_prometheus()
+        assert '# TYPE story_wrapper_stage_seconds_total counter' in text
+        assert 'story_wrapper_stage_items_total{stage="book.segmentation"} 10' in text
+        assert 'story_wrapper_stage_peak_rss_bytes{stage=' not in text
+
+    def test_pipeline(self):
+        """Each spaCy component is timed without changing the results."""
+        nlp = spacy.blank('en')
+        nlp.add_pipe('sentencizer')
+        paragraphs = Book(1, TEST_BOOK_TEXT[0:40000]).paragraphs
+        expected = [[sent.text for sent in doc.sents] for doc in nlp.pipe(paragraphs)]
+        nlp = instrument_pipeline(nlp, self.collector)
+        assert isinstance(nlp.get_pipe('sentencizer'), TimedComponent)
+        assert [[sent.text for sent in doc.sents] for doc in nlp.pipe(paragraphs)] == expected
+        stats = self.collector.stats()
+        assert stats['spacy.tokenizer']['items'] == len(paragraphs)
+        assert stats['spacy.sentencizer']['items'] == len(paragraphs)
+        assert stats['spacy.sentencizer']['seconds'] > 0
+        nlp("A single document.")
+        assert self.collector.stats()['spacy.sentencizer']['items'] == len(paragraphs) + 1
+
+    def test_enable_after_load(self):
+        """The model loaded by nlp_service is only wrapped, and timed, once instrumentation is enabled."""
+        from story_wrapper.config_spacy import configure_pipeline, nlp_service
+        from story_wrapper.instrumentation import instrumentation
+        nlp = spacy.blank('en')
+        nlp.add_pipe('sentencizer')
+        enabled = instrumentation.enabled
+        self.addCleanup(setattr, instrumentation, 'enabled', enabled)
+        self.addCleanup(instrumentation.reset)
+        instrumentation.disable()
+        with patch.object(nlp_service, 'nlp', configure_pipeline(nlp)):
+            assert not isinstance(nlp.get_pipe('sentencizer'), TimedComponent)
+            instrumentation.enable()
+            assert isinstance(nlp.get_pipe('sentencizer'), TimedComponent)
+            list(nlp.pipe(["One sentence. Two sentences."]))
+        assert instrumentation.stats()['spacy.sentencizer']['items'] == 1
+
+    def test_error_handler(self):
+        """Components without a pipe method still run under spaCy's error handler."""
+        @Language.component('fails_on_bad')
+        def fails_on_bad(doc):
+            if doc.text == "bad":
+                raise ValueError("bad doc")
+            return doc
+
+        nlp = spacy.blank('en')
+        nlp.add_pipe('fails_on_bad')
+        nlp = instrument_pipeline(nlp, self.collector)
+        assert not hasattr(nlp.get_pipe('fails_on_bad'), 'pipe')
+        errors = []
+        nlp.set_error_handler(lambda name, proc, docs, e: errors.append(name))
+        # As without instrumentation, the failed doc is reported to the handler and dropped
+        assert [doc.text for doc in nlp.pipe(["good", "bad"])] == ["good"]
+        assert errors == ['fails_on_bad']
+        assert self.collector.stats()['spacy.fails_on_bad']['items'] == 1
+
+    def test_pickle(self):
+        """Instrumented components can be sent to worker processes."""
+        self.collector.record('read', 1.0)
+        collector = pickle.loads(pickle.dumps(self.collector))
+        assert collector.stats()['read']['calls'] == 1
+        collector.record('read', 1.0)
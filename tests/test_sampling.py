@@ -0,0 +1,73 @@
+"""Code to test weighted and stratified book sampling."""
+from collections import Counter
+from unittest import TestCase
+from story_wrapper.data_loaders.sampling import AliasTable, BookSampler
+import random
+
+TEST_MD = {
+    book_id: {
+        'id': book_id,
+        'downloads': downloads,
+        'LCC': {'PR'} if book_id % 2 else {'PS'},
+        'subjects': {'Fiction', 'Sea stories'} if book_id < 4 else {'Fiction'},
+        'authoryearofbirth': 1790 + 20 * book_id if book_id != 5 else None,
+    }
+    for book_id, downloads in [(1, 0), (2, 9), (3, 99), (4, 0), (5, 39), (6, 0)]
+}
+
+
+class TestSampling(TestCase):
+    def setUp(self) -> None:
+        """Set up test."""
+        self.sampler = BookSampler(TEST_MD)
+
+    def test_alias_table(self):
+        """Draws follow the weights."""
+        table = AliasTable([1, 0, 3])
+        rng = random.Random(0)
+        counts = Counter(table.draw(rng) for _ in range(20000))
+        assert counts[1] == 0
+        assert 0.7 < counts[2] / 20000 < 0.8
+        with self.assertRaises(ValueError):
+            AliasTable([0, 0])
+
+    def test_weighted(self):
+        """Weighted samples are reproducible and favour downloaded books."""
+        sample = self.sampler.sample(5000, seed=1)
+        assert sample == self.sampler.sample(5000, seed=1)
+        assert sample != self.sampler.sample(5000, seed=2)
+        counts = Counter(sample)
+        # Weights are downloads + 1
+        assert 0.6 < counts[3] / 5000 < 0.7
+        assert counts[3] > counts[5] > counts[2] > counts[1]
+
+    def test_without_replacement(self):
+        """Samples without replacement have no repeats, for small and large samples."""
+        for n in (1, 4, 6):
+            sample = self.sampler.sample(n, replace=False, seed=3)
+            assert len(set(sample)) == n
+        assert self.sampler.sample(1, weighted=False, replace=False, seed=3) == \
+            self.sampler.sample(1, weighted=False, replace=False, seed=3)
+        with self.assertRaises(ValueError):
+            self.sampler.sample(7, replace=False)
+
+    def test_strata(self):
+        """Samples can be drawn from within a stratum."""
+        assert sorted(self.sampler.strata('LCC')) == ['PR', 'PS']
+        assert set(self.sampler.strata('era')) == {'1800-1849', '1850-1899', '1900-1949', 'unknown'}
+        assert set(self.sampler.sample(100, stratum='PS', key='LCC', seed=0)) <= {2, 4, 6}
+        assert sorted(self.sampler.sample(3, stratum='Sea stories', key='subject', replace=False)) == [1, 2, 3]
+        samples = self.sampler.stratified_sample(2, key='LCC', seed=0)
+        assert set(samples) == {'PR', 'PS'}
+        assert all(len(ids) == 2 for ids in samples.values())
+        assert self.sampler.stratified_sample(2, key='LCC', seed=0) == samples
+        with self.assertRaises(KeyError):
+            self.sampler.sample(1, stratum='QH', key='LCC')
+
+    def test_empty(self):
+        """Sampling from an empty index fails with a clear error."""
+        sampler = BookSampler({})
+        for weighted in (True, False):
+            with self.assertRaisesRegex(ValueError, "no books to sample"):
+                sampler.sample(1, weighted=weighted)
+        assert sampler.stratified_sample(1, key='LCC') == {}
@@ -0,0 +1,10 @@
+"""Code to test that importing the package stays lightweight."""
+from unittest import TestCase
+from benchmarks.startup import measure_import
+
+
+class TestStartup(TestCase):
+    def test_no_heavy_imports(self):
+        """Importing the package does not import spaCy or requests until they are needed."""
+        for module in ['story_wrapper.models.story', 'story_wrapper.data_loaders.cli']:
+            assert measure_import(module, repeat=1)['heavy_modules'] == [], module
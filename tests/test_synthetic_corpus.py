@@ -0,0 +1,35 @@
+"""Code to test the synthetic corpus used by the benchmarks."""
+import os
+import tempfile
+from unittest import TestCase
+from story_wrapper.data_loaders import parseRDF
+from story_wrapper.data_loaders.book import Book
+from benchmarks.synthetic_corpus import generate_book_text, generate_rdf_tarball
+from benchmarks.run_benchmarks import metadata_paths
+
+
+class TestSyntheticCorpus(TestCase):
+    def test_book_text(self):
+        """Synthetic books are deterministic and segment into their chapters."""
+        text = generate_book_text(7, num_chapters=5, paragraphs_per_chapter=4)
+        assert text == generate_book_text(7, num_chapters=5, paragraphs_per_chapter=4)
+        assert text != generate_book_text(7, num_chapters=5, paragraphs_per_chapter=4, seed=1)
+        book = Book(7, text)
+        assert [book.lines[loc] for loc in book.heading_locations[:-1]] == [
+            'CHAPTER I', 'CHAPTER II', 'CHAPTER III', 'CHAPTER IV', 'CHAPTER V'
+        ]
+        assert book.end_line.startswith("End of Project Gutenberg's")
+        assert len(book.paragraphs) == 20
+
+    def test_rdf_tarball(self):
+        """Synthetic RDF catalogues parse into metadata."""
+        with tempfile.TemporaryDirectory() as test_dir:
+            generate_rdf_tarball(os.path.join(test_dir, 'rdf-files.tar.bz2'), num_books=10)
+            with metadata_paths(test_dir):
+                metadata = parseRDF.readmetadata()
+        assert sorted(metadata) == list(range(1, 11))
+        book = metadata[3]
+        assert book['title'] and book['author'] and book['subjects'] and book['LCC']
+        assert book['authoryearofdeath'] > book['authoryearofbirth']
+        assert book['type'] == 'Text'
+        assert book['formats'] == {'text/plain; charset=us-ascii': 'http://www.gutenberg.org/files/3/3.zip'}
@@ -0,0 +1,88 @@
+"""Code to test the pre-fork worker pool."""
+import os
+import queue
+import time
+from unittest import TestCase, skipUnless
+from unittest.mock import patch
+import spacy
+from story_wrapper.config_spacy import nlp_service
+from story_wrapper.workers import PreforkPool, get_worker_nlp, memory_usage, worker_loop
+from tests.test_book import Book, TEST_BOOK_TEXT
+
+
+def fail(message):
+    """Raise an error inside a worker."""
+    raise ValueError(message)
+
+
+def exit_or_large_result(exit_worker):
+    """Exit the worker, or return a result too large to fit in the pipe buffer after a delay."""
+    if exit_worker:
+        os._exit(1)
+    time.sleep(1.5)
+    return b"x" * (1 << 20)
+
+
+def worker_pid_and_nlp(_):
+    """Return the worker pid and the id of its nlp object."""
+    return os.getpid(), id(get_worker_nlp())
+
+
+@skipUnless(os.path.exists('/proc/self/smaps'), "Pre-fork workers are tested on Linux only")
+class TestWorkers(TestCase):
+    def setUp(self) -> None:
+        """Set up test."""
+        self.nlp = spacy.blank('en')
+        self.nlp.add_pipe('sentencizer')
+        self.pool = PreforkPool(n_workers=2, nlp=self.nlp)
+
+    def test_memory_usage(self):
+        """Memory usage is reported for the parent and each worker."""
+        usage = memory_usage()
+        assert 0 < usage['uss'] <= usage['rss']
+        assert usage['pss'] <= usage['rss']
+        report = self.pool.memory_report()
+        assert len(report) == 3
+        assert all(name.startswith(('parent:', 'worker:')) for name in report)
+
+    def test_shared_model(self):
+        """Workers use the model loaded before they were forked."""
+        results = self.pool.map(worker_pid_and_nlp, [(i,) for i in range(10)])
+        assert {nlp_id for _, nlp_id in results} == {id(self.nlp)}
+        assert {pid for pid, _ in results} <= {worker.pid for worker in self.pool.workers}
+        assert nlp_service.nlp is not self.nlp
+
+    def test_process_stories(self):
+        """Stories processed by the workers match in-process results."""
+        paragraphs = Book(1, TEST_BOOK_TEXT).paragraphs
+        texts = [paragraphs[:50], paragraphs[50:60], []]
+        stories = self.pool.process_stories(texts)
+        assert [len(story.docs) for story in stories] == [50, 10, 0]
+        expected = [[sent.text for sent in doc.sents] for doc in self.nlp.pipe(stories[0].text)]
+        assert [[sent.text for sent in doc.sents] for doc in stories[0].docs] == expected
+
+    def test_worker_threads(self):
+        """Workers set their own torch thread count before running tasks."""
+        tasks, results = queue.Queue(), queue.Queue()
+        tasks.put(None)
+        with patch('story_wrapper.workers.set_num_threads') as mock_set_num_threads:
+            worker_loop(tasks, results, self.nlp, 1)
+        mock_set_num_threads.assert_called_once_with(1)
+
+    def test_errors(self):
+        """Errors in workers are raised in the parent."""
+        with self.assertRaises(RuntimeError) as context:
+            self.pool.map(fail, [("bad input",)])
+        assert "bad input" in str(context.exception)
+
+    def test_close_after_worker_died(self):
+        """Closing after a worker died does not hang on results left in the queue."""
+        with self.assertRaises(RuntimeError) as context:
+            self.pool.map(exit_or_large_result, [(True,), (False,), (False,)])
+        assert "exited unexpectedly" in str(context.exception)
+        self.pool.close()
+        assert self.pool.workers == []
+
+    def tearDown(self):
+        """Stop the workers."""
+        self.pool.close()